@@ -1,13 +1,14 @@
-import requests
 import json
 import os
 import json
-import time
 from datetime import datetime, timedelta
 from neo4j import GraphDatabase
 from dotenv import load_dotenv
 import logging
 from typing import Dict, List, Optional
+from tmdb_client import TMDBClient, DEFAULT_CONCURRENCY
+from response_cache import ResponseCache
+from schema import ensure_schema
 
 
 #looging
@@ -23,12 +24,14 @@ neo4j_user = os.getenv('NEO4J_USER')
 neo4j_password = os.getenv('NEO4J_PASSWORD')
 
 class MovieDatabase:
-    def __init__(self):
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY):
         self.base_url ='https://api.themoviedb.org/3'
         self.headers = {
             'Authorization': f'Bearer {access_token}',
             'accept': 'application/json'
         }
+        self.client = TMDBClient(access_token, base_url=self.base_url, concurrency=concurrency,
+                                 cache=ResponseCache())
 
         self.driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
 
@@ -43,19 +46,19 @@ class MovieDatabase:
         Fetch popular movies from TMDB API
         """
 
-        all_movies = []
-        for page in range(1, num_pages + 1):
+        def fetch_page(page):
             try:
-                url = f'{self.base_url}/movie/popular?language=en-US&page={page}'
-                response = requests.get(url, headers=self.headers)
-                response.raise_for_status()
-                data = response.json()
-                all_movies.extend(data['results'])
+                data = self.client.get('/movie/popular', {'language': 'en-US', 'page': page})
                 logger.info(f'Fetched page {page} of popular movies')
-                #rate limit
-                time.sleep(0.25)
+                return data['results']
             except Exception as e:
                 logger.error(f'Error fetching page {page}: {str(e)}')
+                return []
+
+        #rate limit is handled by the client's shared token bucket
+        all_movies = []
+        for results in self.client.map(fetch_page, range(1, num_pages + 1)):
+            all_movies.extend(results)
         return all_movies
         
     def fetch_movie_details(self, movie_id):
@@ -66,10 +69,10 @@ class MovieDatabase:
         '''
 
         try:
-            url = f'{self.base_url}/movie/{movie_id}?append_to_response=credits,keywords'
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
-            return response.json()
+            # Revalidate the cached copy so a load never writes week-old
+            # ratings; unchanged movies come back as cheap 304s
+            return self.client.get(f'/movie/{movie_id}', {'append_to_response': 'credits,keywords'},
+                                   refresh=True)
         except Exception as e:
             logger.error(f"Error fetching details for movie {movie_id}: {str(e)}")
             return None
@@ -83,7 +86,9 @@ class MovieDatabase:
         SET 
             m.title = $title,
             m.overview = $overview,
-            m.release_date = $release_date,
+            m.release_date = CASE WHEN coalesce($release_date, '') = '' THEN null ELSE date($release_date) END,
+            m.release_year = CASE WHEN coalesce($release_date, '') = '' THEN null
+                                  ELSE toInteger(substring($release_date, 0, 4)) END,
             m.vote_average = $vote_average,
             m.vote_count = $vote_count,
             m.popularity = $popularity,
@@ -153,9 +158,9 @@ class MovieDatabase:
             movies = self.fetch_popular_movies(num_pages=10)  # Fetches 200 movies (20 per page)
             
             with self.driver.session() as session:
-                for movie in movies:
-                    # Fetch detailed information for each movie
-                    details = self.fetch_movie_details(movie['id'])
+                # Fetch detailed information for each movie, several at a time
+                movie_ids = [movie['id'] for movie in movies]
+                for details in self.client.map(self.fetch_movie_details, movie_ids):
                     if not details:
                         continue
 
@@ -175,23 +180,17 @@ class MovieDatabase:
                                 session.execute_write(self.create_person_node, crew, 'DIRECTED')
 
                     logger.info(f"Processed movie: {details['title']}")
-                    time.sleep(0.25)  # Rate limiting
 
         except Exception as e:
             logger.error(f"Error updating database: {str(e)}")
 
 def main():
-    # Create indexes for better performance
-    # def create_indexes(tx):
-    #     tx.run("CREATE INDEX movie_tmdb_id IF NOT EXISTS FOR (m:Movie) ON (m.tmdb_id)")
-    #     tx.run("CREATE INDEX person_tmdb_id IF NOT EXISTS FOR (p:Person) ON (p.tmdb_id)")
-
     movie_db = MovieDatabase()
     
     try:
-        # Create indexes
+        # Create constraints and indexes for better performance
         with movie_db.driver.session() as session:
-            session.execute_write(create_indexes)
+            ensure_schema(session)
 
         # Update database
         movie_db.update_database()
@@ -0,0 +1,179 @@
+import logging
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Entries kept on each leaderboard
+DEFAULT_BOARD_SIZE = 10
+
+# Leaderboards read by the Analytics Dashboard: ranked label and property,
+# and which nodes qualify. Each is a (:Leaderboard {name}) node with one
+# RANKS relationship, carrying rank and value, per entry.
+BOARDS = {
+    'top_rated': ('Movie', 'vote_average', 'n.vote_count > 100'),
+    'most_popular': ('Movie', 'popularity', 'true'),
+    'prolific_actors': ('Person', 'movie_count', 'true'),
+}
+
+# Number and average rating of the movies acted in by each actor of the
+# given movies, and by the given people who just lost a credit
+_ACTOR_STATS = """
+CALL {
+    UNWIND $ids AS id
+    MATCH (:Movie {tmdb_id: id})<-[:ACTED_IN]-(p:Person)
+    RETURN p
+    UNION
+    UNWIND $people AS person_id
+    MATCH (p:Person {tmdb_id: person_id})
+    RETURN p
+}
+WITH DISTINCT p
+CALL {
+    WITH p
+    OPTIONAL MATCH (p)-[:ACTED_IN]->(m:Movie)
+    RETURN count(m) AS movies, avg(m.vote_average) AS rating
+}
+SET p.movie_count = movies, p.avg_rating = rating
+RETURN collect(p.tmdb_id) AS ids
+"""
+
+# Running movie count, rating sum and popularity sum per genre, updated by
+# delta: each movie records the genres and values it was last counted with
+# (genre_stats_*), which are taken back out before its current genres and
+# values are added. Rewriting an unchanged movie nets to zero, and a
+# replaced one moves between genres, without reading any other movie.
+# Setting _lock takes the genre's write lock before its sums are read, so
+# concurrent writers don't lose each other's updates.
+_GENRE_STATS = """
+UNWIND $ids AS id
+MATCH (m:Movie {tmdb_id: id})
+CALL {
+    WITH m
+    UNWIND coalesce(m.genre_stats_ids, []) AS genre_id
+    MATCH (g:Genre {tmdb_id: genre_id})
+    SET g._lock = true
+    REMOVE g._lock
+    SET g.movie_count = g.movie_count - 1,
+        g.rating_sum = g.rating_sum - m.genre_stats_rating,
+        g.popularity_sum = g.popularity_sum - m.genre_stats_popularity
+}
+CALL {
+    WITH m
+    MATCH (m)-[:IN_GENRE]->(g:Genre)
+    SET g._lock = true
+    REMOVE g._lock
+    SET g.movie_count = coalesce(g.movie_count, 0) + 1,
+        g.rating_sum = coalesce(g.rating_sum, 0.0) + coalesce(m.vote_average, 0.0),
+        g.popularity_sum = coalesce(g.popularity_sum, 0.0) + coalesce(m.popularity, 0.0)
+    RETURN collect(g.tmdb_id) AS genre_ids
+}
+SET m.genre_stats_ids = genre_ids,
+    m.genre_stats_rating = coalesce(m.vote_average, 0.0),
+    m.genre_stats_popularity = coalesce(m.popularity, 0.0)
+"""
+
+_RANK = """
+WITH n ORDER BY n.{prop} DESC, n.tmdb_id LIMIT $size
+WITH collect(n) AS ranked
+MERGE (b:Leaderboard {{name: $name}})
+WITH b, ranked
+OPTIONAL MATCH (b)-[old:RANKS]->()
+DELETE old
+WITH DISTINCT b, ranked
+UNWIND range(0, size(ranked) - 1) AS i
+WITH b, ranked[i] AS n, i
+CREATE (b)-[:RANKS {{rank: i + 1, value: n.{prop}}}]->(n)
+"""
+
+
+def refresh_board(tx, name: str, touched: Optional[List[int]] = None, size: int = DEFAULT_BOARD_SIZE):
+    """
+    Re-rank leaderboard `name` after the nodes with tmdb_ids `touched`
+    changed. Nodes that neither changed nor were on the full board still
+    rank below it, so only the board and `touched` are compared. If a board
+    entry itself changed it may have dropped, so the board is re-ranked from
+    the property's index instead, as it is when `touched` is None.
+    """
+    label, prop, condition = BOARDS[name]
+    current = [record['id'] for record in tx.run(
+        "MATCH (:Leaderboard {name: $name})-[:RANKS]->(n) RETURN n.tmdb_id AS id", name=name)]
+    if touched is not None and len(current) == size and not set(touched) & set(current):
+        tx.run(f"""
+        MATCH (n:{label})
+        WHERE n.tmdb_id IN $candidates AND n.{prop} IS NOT NULL AND {condition}
+        """ + _RANK.format(prop=prop), candidates=current + list(touched), name=name, size=size).consume()
+    else:
+        tx.run(f"""
+        MATCH (n:{label})
+        WHERE n.{prop} IS NOT NULL AND {condition}
+        """ + _RANK.format(prop=prop), name=name, size=size).consume()
+
+
+def update_analytics(tx, movie_ids: List[int], size: int = DEFAULT_BOARD_SIZE,
+                     uncredited: Optional[List[int]] = None):
+    """
+    Refresh the dashboard aggregates touched by freshly written movies: the
+    stats of their actors, their genres' running sums and the leaderboards
+    they or their actors may now be on. People in `uncredited` lost an
+    ACTED_IN credit while the movies were replaced, so they are recounted
+    (and possibly dropped from prolific_actors) too.
+    """
+    if not movie_ids:
+        return
+    record = tx.run(_ACTOR_STATS, ids=movie_ids, people=uncredited or []).single()
+    actor_ids = record['ids'] if record else []
+    tx.run(_GENRE_STATS, ids=movie_ids).consume()
+    refresh_board(tx, 'top_rated', movie_ids, size)
+    refresh_board(tx, 'most_popular', movie_ids, size)
+    refresh_board(tx, 'prolific_actors', actor_ids, size)
+
+
+def rebuild_analytics(driver, size: int = DEFAULT_BOARD_SIZE):
+    """
+    Recompute every actor's and genre's stats and every leaderboard from
+    scratch, e.g. for a graph loaded before they were maintained at ingest
+    """
+    with driver.session() as session:
+        session.run("""
+        MATCH (p:Person)
+        WHERE (p)-[:ACTED_IN]->()
+        CALL {
+            WITH p
+            MATCH (p)-[:ACTED_IN]->(m:Movie)
+            WITH p, count(m) AS movies, avg(m.vote_average) AS rating
+            SET p.movie_count = movies, p.avg_rating = rating
+        } IN TRANSACTIONS OF 10000 ROWS
+        """).consume()
+        rebuild_genre_stats(session)
+        for name in BOARDS:
+            session.execute_write(refresh_board, name, None, size)
+        logger.info(f"Rebuilt analytics for {len(BOARDS)} leaderboards")
+
+
+def rebuild_genre_stats(session):
+    """
+    Recount every genre's running sums from scratch and record what each
+    movie was counted with, so later batches can apply deltas
+    """
+    session.run("""
+    MATCH (m:Movie)
+    CALL {
+        WITH m
+        OPTIONAL MATCH (m)-[:IN_GENRE]->(g:Genre)
+        WITH m, collect(g.tmdb_id) AS genre_ids
+        SET m.genre_stats_ids = genre_ids,
+            m.genre_stats_rating = coalesce(m.vote_average, 0.0),
+            m.genre_stats_popularity = coalesce(m.popularity, 0.0)
+    } IN TRANSACTIONS OF 10000 ROWS
+    """).consume()
+    session.run("""
+    MATCH (g:Genre)
+    CALL {
+        WITH g
+        OPTIONAL MATCH (g)<-[:IN_GENRE]-(m:Movie)
+        WITH g, count(m) AS movies, sum(coalesce(m.vote_average, 0.0)) AS ratings,
+             sum(coalesce(m.popularity, 0.0)) AS popularity
+        SET g.movie_count = movies, g.rating_sum = ratings, g.popularity_sum = popularity
+        REMOVE g.avg_rating, g.avg_popularity
+    } IN TRANSACTIONS OF 10000 ROWS
+    """).consume()
@@ -1,12 +1,22 @@
 import streamlit as st 
 import pandas as pd
-from neo4j import GraphDatabase
+from neo4j_pool import PooledDriver
 from dotenv import load_dotenv
 import os
 import plotly.express as px
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from query_cache import QueryCache, DATA_VERSION_QUERY
+from title_index import TitleIndex
+from movie_search import (lucene_title_query, filter_params, browse_query, title_search_query,
+                          cursor_params, next_cursor, TITLE_INDEX, PAGE_SIZE,
+                          OVERVIEWS_QUERY)
+try:
+    from recommender import SparseRecommender
+except ImportError:
+    # scipy not installed; only the Neo4j recommendation engine is offered
+    SparseRecommender = None
 
 #DONE
 #NEEDS TESTING
@@ -146,7 +156,12 @@ email_receiver = os.getenv('EMAIL_RECEIVER')
 
 
 # Initialize Neo4j connection
-driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
+@st.cache_resource
+def get_driver():
+    # One connection pool per server process, shared by every session and rerun
+    return PooledDriver(neo4j_uri, (neo4j_user, neo4j_password))
+
+driver = get_driver()
 
 
 # st.markdown(
@@ -160,7 +175,61 @@ driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
 #     unsafe_allow_html=True
 # )
 
+@st.cache_resource
+def get_query_cache():
+    # One cache per server process, shared by every session
+    return QueryCache()
+
+query_cache = get_query_cache()
+
+def fetch_data_version():
+    # Bumped by the loader after every successful run
+    with driver.session() as session:
+        record = session.run(DATA_VERSION_QUERY).single()
+        return record['version'] if record else None
+
 def run_query(query, params=None):
+    query_cache.check_version(fetch_data_version)
+    return query_cache.cached(query, params, lambda: run_uncached_query(query, params))
+
+# Filmographies of a list of people, keyed by elementId
+FILMOGRAPHY_QUERY = """
+UNWIND $person_ids AS person_id
+MATCH (p:Person)
+WHERE elementId(p) = person_id
+MATCH (p)-[:ACTED_IN|DIRECTED]->(m:Movie)
+WITH person_id, m
+ORDER BY m.release_date DESC
+RETURN person_id, collect({
+    title: m.title,
+    release_date: m.release_date,
+    rating: m.vote_average
+}) AS movies
+"""
+
+def fetch_filmographies(person_ids):
+    # One round trip for everyone not cached yet; results are cached per person
+    query_cache.check_version(fetch_data_version)
+    return query_cache.cached_batch(
+        FILMOGRAPHY_QUERY, "person_id", person_ids,
+        lambda missing: {
+            row['person_id']: row['movies']
+            for row in run_uncached_query(FILMOGRAPHY_QUERY, {"person_ids": missing})
+        },
+        default=[]
+    )
+
+@st.cache_resource(max_entries=1)
+def get_title_index(data_version):
+    # Rebuilt from the graph whenever the loader bumps the data version
+    return TitleIndex.from_driver(driver)
+
+@st.cache_resource(max_entries=1)
+def get_recommender(data_version):
+    # Rebuilt from the graph whenever the loader bumps the data version
+    return SparseRecommender.from_driver(driver)
+
+def run_uncached_query(query, params=None):
     with driver.session() as session:
         result = session.run(query, params)
         return [dict(record) for record in result]
@@ -254,6 +323,7 @@ if page == "Movie Search":
             search_term = st.text_input("Movie title", "")
             
             sort_options = [
+                "Relevance",
                 "Release Date (Newest)",
                 "Release Date (Oldest)",
                 "Rating (Highest)",
@@ -269,7 +339,7 @@ if page == "Movie Search":
                 )
         else:
             search_term = st.text_input("Quick search", placeholder="Enter movie title")
-            selected_sort = "Rating (Highest)"
+            selected_sort = "Relevance" if search_term else "Rating (Highest)"
             min_rating = 0.0
             year_range = (2000, 2024)
         
@@ -311,55 +381,39 @@ if page == "Movie Search":
 
     with main_col:
         # Construct the query based on filters and sorting
-        sort_clause = {
-            "Release Date (Newest)": "ORDER BY m.release_date DESC",
-            "Release Date (Oldest)": "ORDER BY m.release_date ASC",
-            "Rating (Highest)": "ORDER BY m.vote_average DESC",
-            "Rating (Lowest)": "ORDER BY m.vote_average ASC"
-        }[selected_sort]
-        
-        if not search_term:
-            query = f"""
-            MATCH (m:Movie)
-            WHERE m.vote_average >= $min_rating
-            AND toInteger(substring(m.release_date, 0, 4)) >= $start_year
-            AND toInteger(substring(m.release_date, 0, 4)) <= $end_year
-            RETURN m.title as title, 
-                   m.release_date as release_date,
-                   m.vote_average as rating,
-                   m.overview as overview,
-                   m.poster_path as poster,
-                   m.vote_count as vote_count
-            {sort_clause}
-            LIMIT 15
-            """
-            results = run_query(query, {
-                "min_rating": min_rating,
-                "start_year": year_range[0],
-                "end_year": year_range[1]
-            })
+        params = filter_params(min_rating, year_range)
+        lucene_query = lucene_title_query(search_term)
+
+        if not lucene_query and selected_sort == "Relevance":
+            selected_sort = "Rating (Highest)"
+
+        # Cursors of the pages before the current one; a new search starts over
+        search_key = (lucene_query, selected_sort, min_rating, tuple(year_range))
+        if st.session_state.get("search_key") != search_key:
+            st.session_state.search_key = search_key
+            st.session_state.search_cursors = []
+        cursors = st.session_state.search_cursors
+        cursor = cursors[-1] if cursors else None
+        params.update(cursor_params(cursor))
+
+        if not lucene_query:
+            results = run_query(browse_query(selected_sort, after=cursor is not None), params)
         else:
-            query = f"""
-            MATCH (m:Movie)
-            WHERE m.title CONTAINS $search_term
-            AND m.vote_average >= $min_rating
-            AND toInteger(substring(m.release_date, 0, 4)) >= $start_year
-            AND toInteger(substring(m.release_date, 0, 4)) <= $end_year
-            RETURN m.title as title, 
-                   m.release_date as release_date,
-                   m.vote_average as rating,
-                   m.overview as overview,
-                   m.poster_path as poster,
-                   m.vote_count as vote_count
-            {sort_clause}
-            LIMIT 15
-            """
-            results = run_query(query, {
-                "search_term": search_term,
-                "min_rating": min_rating,
-                "start_year": year_range[0],
-                "end_year": year_range[1]
+            results = run_query(title_search_query(selected_sort, after=cursor is not None), {
+                "index": TITLE_INDEX,
+                "lucene_query": lucene_query,
+                **params
             })
+        has_next = len(results) > PAGE_SIZE
+        results = results[:PAGE_SIZE]
+
+        # Overviews of every opened card, in one round trip
+        open_ids = [movie['tmdb_id'] for movie in results
+                    if st.session_state.get(f"overview_{movie['tmdb_id']}")]
+        overviews = {}
+        if open_ids:
+            overviews = {row['tmdb_id']: row['overview']
+                         for row in run_query(OVERVIEWS_QUERY, {"ids": sorted(open_ids)})}
         
         # Display movies in a grid
         if results:
@@ -380,8 +434,20 @@ if page == "Movie Search":
                             st.write(f"📅 {movie['release_date']}")
                             st.write(f"👥 {movie['vote_count']} votes")
                             
-                            with st.expander("Overview"):
-                                st.write(movie['overview'])
+                            if st.toggle("Overview", key=f"overview_{movie['tmdb_id']}"):
+                                st.write(overviews.get(movie['tmdb_id']) or "No overview available.")
+
+            prev_col, page_col, next_col = st.columns([1, 2, 1])
+            with prev_col:
+                if st.button("← Previous", disabled=not cursors, key="search_prev"):
+                    cursors.pop()
+                    st.rerun()
+            with page_col:
+                st.caption(f"Page {len(cursors) + 1}")
+            with next_col:
+                if st.button("Next →", disabled=not has_next, key="search_next"):
+                    cursors.append(next_cursor(results[-1]))
+                    st.rerun()
         else:
             if search_term:
                 st.info("No movies found matching your criteria.")
@@ -467,15 +533,20 @@ elif page == "Movie Recommendations":
         st.session_state.cast_popup_type = None
         st.session_state.button_clicked = False
     
-    query = """
-    MATCH (m:Movie)
-    RETURN m.title as title
-    ORDER BY m.title
-    """
-    movies = run_query(query)
-    movie_titles = [m['title'] for m in movies]
-    
-    selected_movie = st.selectbox("Select a movie you like", movie_titles)
+    # Type-ahead: only the best matches for what was typed reach the browser
+    query_cache.check_version(fetch_data_version)
+    title_prefix = st.text_input("Find a movie you like", placeholder="Start typing a title")
+    matches = get_title_index(query_cache.data_version).search(title_prefix)
+    labels = {movie['tmdb_id']: TitleIndex.label(movie) for movie in matches}
+    selected_movie = st.selectbox(
+        "Select a movie you like",
+        list(labels),
+        format_func=labels.get,
+        placeholder="No matching movies" if title_prefix else "Type a title above"
+    )
+    engine = "Neo4j"
+    if SparseRecommender is not None:
+        engine = st.radio("Recommendation engine", ["Neo4j", "In-memory"], horizontal=True)
     
     def show_cast_popup(data, popup_type):
         st.session_state.show_cast_popup = True
@@ -490,9 +561,55 @@ elif page == "Movie Recommendations":
         st.session_state.button_clicked = False
     
     if selected_movie:
-        # Updated query
+        # Top 10 precomputed by the loader as SIMILAR_TO relationships
+        # (see similarity.py); only their shared cast and tags are expanded here
+        similar_query = """
+                MATCH (source:Movie {tmdb_id: $tmdb_id})-[r:SIMILAR_TO]->(m:Movie)
+                WITH source, m, r
+                ORDER BY r.score DESC
+                LIMIT 10
+
+                OPTIONAL MATCH (m)<-[:ACTED_IN]-(a:Person)-[:ACTED_IN]->(source)
+                WITH source, m, r, collect(DISTINCT {
+                    name: a.name,
+                    profile_path: a.profile_path,
+                    id: CASE WHEN a IS NOT NULL THEN elementId(a) ELSE NULL END
+                }) AS common_actors
+
+                OPTIONAL MATCH (m)<-[:DIRECTED]-(d:Person)-[:DIRECTED]->(source)
+                WITH source, m, r, common_actors, collect(DISTINCT {
+                    name: d.name,
+                    profile_path: d.profile_path,
+                    id: CASE WHEN d IS NOT NULL THEN elementId(d) ELSE NULL END
+                }) AS common_directors
+
+                OPTIONAL MATCH (m)-[:IN_GENRE]->(g:Genre)<-[:IN_GENRE]-(source)
+                WITH source, m, r, common_actors, common_directors, collect(DISTINCT g.name) AS common_genres
+
+                OPTIONAL MATCH (m)-[:HAS_KEYWORD]->(k:Keyword)<-[:HAS_KEYWORD]-(source)
+                WITH m, r, common_actors, common_directors, common_genres, collect(DISTINCT k.name) AS common_keywords
+
+                RETURN m.title AS title,
+                    m.vote_average AS rating,
+                    m.vote_count AS vote_count,
+                    m.overview AS overview,
+                    m.poster_path AS poster,
+                    m.release_date AS release_date,
+                    r.score AS recommendation_score,
+                    [x IN common_actors WHERE x.id IS NOT NULL] AS common_actors,
+                    [x IN common_directors WHERE x.id IS NOT NULL] AS common_directors,
+                    common_genres,
+                    common_keywords,
+                    r.actors AS actor_count,
+                    r.directors AS director_count,
+                    r.genres AS genre_count,
+                    r.keywords AS keyword_count
+                ORDER BY recommendation_score DESC
+                """
+
+        # Scores every movie on the fly; used for movies without SIMILAR_TO yet
         query="""
-                MATCH (source:Movie {title: $title})
+                MATCH (source:Movie {tmdb_id: $tmdb_id})
                 MATCH (m:Movie)
                 WHERE m <> source
 
@@ -631,8 +748,14 @@ elif page == "Movie Recommendations":
         #     LIMIT 4;
 
         #     """
-        # Pass the selected_movie as the title parameter
-        recommendations = run_query(query, {"title": selected_movie})
+        # Pass the selected movie's tmdb_id as the parameter
+        if engine == "In-memory":
+            query_cache.check_version(fetch_data_version)
+            recommendations = get_recommender(query_cache.data_version).recommend(selected_movie)
+        else:
+            recommendations = run_query(similar_query, {"tmdb_id": selected_movie})
+            if not recommendations:
+                recommendations = run_query(query, {"tmdb_id": selected_movie})
         
         # Display popup if active
         if st.session_state.show_cast_popup and st.session_state.cast_popup_data and st.session_state.button_clicked:
@@ -645,6 +768,8 @@ elif page == "Movie Recommendations":
                     close_popup()
                     st.rerun()
                 
+                filmographies = fetch_filmographies([person['id'] for person in popup_data])
+                
                 for person in popup_data:
                     st.write("---")
                     if person['profile_path']:
@@ -654,17 +779,6 @@ elif page == "Movie Recommendations":
                     
                     st.subheader(person['name'])
                     
-                    # Fetch filmography
-                    filmography_query = """
-                        MATCH (p:Person)
-                    WHERE elementId(p) = $person_id
-                    MATCH (p)-[r:ACTED_IN|DIRECTED]->(m:Movie)
-                    RETURN m.title as title,
-                           m.release_date as release_date,
-                           m.vote_average as rating
-                    ORDER BY m.release_date DESC
-
-                    """
                     # MATCH (p:Person)-[:{popup_type.upper()}_IN]->(m:Movie)
                     # WHERE id(p) = $person_id
                     # RETURN m.title as title,
@@ -672,11 +786,11 @@ elif page == "Movie Recommendations":
                     #        m.vote_average as rating
                     # ORDER BY m.release_date DESC
                     
-                    filmography = run_query(filmography_query, {"person_id": person['id']})
+                    filmography = filmographies.get(person['id'])
                     
                     if filmography:
                         st.write("Filmography:")
-                        df = pd.DataFrame(filmography)
+                        df = pd.DataFrame(filmography, columns=['title', 'release_date', 'rating'])
                         df.columns = ['Movie', 'Release Date', 'Rating']
                         st.dataframe(df, hide_index=True)
         
@@ -729,7 +843,7 @@ elif page == "Movie Recommendations":
 
 elif page == "Analytics Dashboard":
     st.header("📊 Analytics Dashboard")
-    tab1, tab2, tab3 = st.tabs(["Top Rated", "Most Popular", "Actor Analysis"])
+    tab1, tab2, tab3, tab4 = st.tabs(["Top Rated", "Most Popular", "Actor Analysis", "Genres"])
 
     # Get screen width using Streamlit's layout features
     use_container_width = True
@@ -769,7 +883,14 @@ elif page == "Analytics Dashboard":
         )
         return fig
 
+    # Leaderboards are kept up to date by the loader (see analytics.py); the
+    # full scans only run for graphs loaded before they existed
     with tab1:
+        board_query = """
+        MATCH (:Leaderboard {name: 'top_rated'})-[r:RANKS]->(m:Movie)
+        RETURN m.title as title, m.vote_average as rating, m.vote_count as votes
+        ORDER BY r.rank
+        """
         query = """
         MATCH (m:Movie)
         WHERE m.vote_count > 100
@@ -777,7 +898,7 @@ elif page == "Analytics Dashboard":
         ORDER BY m.vote_average DESC
         LIMIT 10
         """
-        top_rated = pd.DataFrame(run_query(query))
+        top_rated = pd.DataFrame(run_query(board_query) or run_query(query))
         st.subheader("Top Rated Movies")
         fig = create_responsive_bar(
             top_rated,
@@ -791,13 +912,18 @@ elif page == "Analytics Dashboard":
         st.plotly_chart(fig, use_container_width=use_container_width)
 
     with tab2:
+        board_query = """
+        MATCH (:Leaderboard {name: 'most_popular'})-[r:RANKS]->(m:Movie)
+        RETURN m.title as title, m.popularity as popularity, m.vote_count as votes
+        ORDER BY r.rank
+        """
         query = """
         MATCH (m:Movie)
         RETURN m.title as title, m.popularity as popularity, m.vote_count as votes
         ORDER BY m.popularity DESC
         LIMIT 10
         """
-        popular = pd.DataFrame(run_query(query))
+        popular = pd.DataFrame(run_query(board_query) or run_query(query))
         st.subheader("Most Popular Movies")
         fig = create_responsive_bar(
             popular,
@@ -811,13 +937,18 @@ elif page == "Analytics Dashboard":
         st.plotly_chart(fig, use_container_width=use_container_width)
 
     with tab3:
+        board_query = """
+        MATCH (:Leaderboard {name: 'prolific_actors'})-[r:RANKS]->(a:Person)
+        RETURN a.name as actor, a.movie_count as movie_count, a.avg_rating as avg_rating
+        ORDER BY r.rank
+        """
         query = """
         MATCH (a:Person)-[r:ACTED_IN]->(m:Movie)
         RETURN a.name as actor, count(m) as movie_count, avg(m.vote_average) as avg_rating
         ORDER BY movie_count DESC
         LIMIT 10
         """
-        prolific_actors = pd.DataFrame(run_query(query))
+        prolific_actors = pd.DataFrame(run_query(board_query) or run_query(query))
         st.subheader("Most Prolific Actors")
         fig = create_responsive_bar(
             prolific_actors,
@@ -830,6 +961,43 @@ elif page == "Analytics Dashboard":
         )
         st.plotly_chart(fig, use_container_width=use_container_width)
 
-
-# Cleanup
-driver.close()
\ No newline at end of file
+    with tab4:
+        query = """
+        MATCH (g:Genre)
+        WHERE g.movie_count > 0
+        RETURN g.name as genre, g.movie_count as movie_count,
+               g.rating_sum / g.movie_count as avg_rating,
+               g.popularity_sum / g.movie_count as avg_popularity
+        ORDER BY movie_count DESC
+        """
+        genre_stats = pd.DataFrame(run_query(query))
+        st.subheader("Genre Statistics")
+        if genre_stats.empty:
+            st.info("Genre statistics appear after the next load, or run the loader with --rebuild-analytics.")
+        else:
+            fig = create_responsive_bar(
+                genre_stats,
+                'genre',
+                'movie_count',
+                "Movies per Genre",
+                'Genre',
+                'Number of Movies',
+                'avg_rating'
+            )
+            st.plotly_chart(fig, use_container_width=use_container_width)
+            st.dataframe(genre_stats, hide_index=True)
+
+
+with st.sidebar.expander("Query cache"):
+    cache_stats = query_cache.stats()
+    st.write(f"Hit rate: {cache_stats['hit_rate']:.0%} ({cache_stats['hits']} hits, {cache_stats['misses']} misses)")
+    st.write(f"Entries: {cache_stats['entries']} ({cache_stats['bytes'] / (1024 * 1024):.1f} MB)")
+    st.write(f"Evictions: {cache_stats['evictions']}, expired: {cache_stats['expired']}, "
+             f"invalidations: {cache_stats['invalidations']}")
+
+with st.sidebar.expander("Connection pool"):
+    pool_stats = driver.stats()
+    st.write(f"In use: {pool_stats['in_use']}/{pool_stats['pool_size']} "
+             f"(peak {pool_stats['peak_in_use']}, {pool_stats['utilization']:.0%} busy)")
+    st.write(f"Sessions: {pool_stats['sessions']}, errors: {pool_stats['errors']}, "
+             f"avg {pool_stats['avg_session_ms']} ms")
\ No newline at end of file
@@ -0,0 +1,350 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import logging
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+# Keep benchmark runs from overwriting a real run's checkpoint file
+os.environ['INGEST_CHECKPOINT_PATH'] = os.path.join(tempfile.mkdtemp(prefix='tmdb-bench-'), 'checkpoint.json')
+
+from neo4j_setup_ import MovieDatabase
+from ingest_metrics import IngestMetrics
+from schema import CONSTRAINTS, INDEXES
+
+logger = logging.getLogger(__name__)
+
+# TMDB's movie genre list
+GENRES = [
+    (28, 'Action'), (12, 'Adventure'), (16, 'Animation'), (35, 'Comedy'), (80, 'Crime'),
+    (99, 'Documentary'), (18, 'Drama'), (10751, 'Family'), (14, 'Fantasy'), (36, 'History'),
+    (27, 'Horror'), (10402, 'Music'), (9648, 'Mystery'), (10749, 'Romance'), (878, 'Science Fiction'),
+    (10770, 'TV Movie'), (53, 'Thriller'), (10752, 'War'), (37, 'Western'),
+]
+
+RESULTS_PER_PAGE = 20
+
+# Effectively no client-side rate limit, so the stub's latency is what's measured
+DEFAULT_BENCHMARK_RATE = 10000.0
+
+
+class StubTMDBServer:
+    """
+    Local HTTP server answering /movie/popular, /movie/{id} (with credits and
+    keywords) and /genre/movie/list with synthetic, deterministic payloads.
+    Every response is delayed by `latency` seconds. Cast members and keywords
+    are drawn from fixed pools so that, as on TMDB, they recur across movies.
+    """
+
+    def __init__(self, latency: float = 0.05, cast_size: int = 20, keyword_count: int = 10,
+                 people: int = 5000, keyword_pool: int = 2000, port: int = 0):
+        self.latency = latency
+        self.cast_size = cast_size
+        self.keyword_count = keyword_count
+        self.people = max(people, cast_size + 1)
+        self.keyword_pool = max(keyword_pool, keyword_count)
+        self.port = port
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.server = None
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def popular_page(self, page: int) -> Dict:
+        first = (page - 1) * RESULTS_PER_PAGE + 1
+        return {
+            'page': page,
+            'results': [
+                {'id': movie_id, 'title': f'Movie {movie_id}', 'popularity': 1000.0 / movie_id}
+                for movie_id in range(first, first + RESULTS_PER_PAGE)
+            ],
+            'total_pages': 500,
+            'total_results': 500 * RESULTS_PER_PAGE,
+        }
+
+    def movie_details(self, movie_id: int) -> Dict:
+        rng = random.Random(movie_id)
+        people = rng.sample(range(1, self.people + 1), self.cast_size + 1)
+        director = people.pop()
+        return {
+            'id': movie_id,
+            'title': f'Movie {movie_id}',
+            'overview': ' '.join(rng.choice(['a', 'heist', 'family', 'space', 'love', 'war', 'secret'])
+                                 for _ in range(60)),
+            'release_date': f'{rng.randint(1950, 2026)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+            'vote_average': round(rng.uniform(1, 10), 1),
+            'vote_count': rng.randint(0, 30000),
+            'popularity': round(1000.0 / movie_id, 3),
+            'poster_path': f'/poster{movie_id}.jpg',
+            'genres': [{'id': genre_id, 'name': name} for genre_id, name in rng.sample(GENRES, rng.randint(1, 3))],
+            'keywords': {'keywords': [
+                {'id': keyword_id, 'name': f'keyword {keyword_id}'}
+                for keyword_id in rng.sample(range(1, self.keyword_pool + 1), self.keyword_count)
+            ]},
+            'credits': {
+                'cast': [
+                    {'id': person_id, 'name': f'Person {person_id}', 'character': f'Character {order}',
+                     'profile_path': f'/profile{person_id}.jpg', 'order': order}
+                    for order, person_id in enumerate(people)
+                ],
+                'crew': [
+                    {'id': director, 'name': f'Person {director}', 'job': 'Director',
+                     'department': 'Directing', 'profile_path': f'/profile{director}.jpg'}
+                ],
+            },
+        }
+
+    def respond(self, path: str, params: Dict) -> Optional[Dict]:
+        if path == '/movie/popular':
+            return self.popular_page(int(params.get('page', ['1'])[0]))
+        if path == '/genre/movie/list':
+            return {'genres': [{'id': genre_id, 'name': name} for genre_id, name in GENRES]}
+        if path.startswith('/movie/') and path[len('/movie/'):].isdigit():
+            return self.movie_details(int(path[len('/movie/'):]))
+        return None
+
+    def start(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub.lock:
+                    stub.requests += 1
+                time.sleep(stub.latency)
+                url = urlparse(self.path)
+                data = stub.respond(url.path, parse_qs(url.query))
+                body = json.dumps(data if data is not None else {'status_message': 'Not found'}).encode('utf-8')
+                self.send_response(200 if data is not None else 404)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 256
+
+        self.server = Server(('127.0.0.1', self.port), Handler)
+        threading.Thread(target=self.server.serve_forever, name='tmdb-stub', daemon=True).start()
+        logger.info(f"TMDB stub listening on {self.base_url}")
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+
+class InMemoryResult:
+    def __init__(self, records: List[Dict]):
+        self.records = records
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def single(self):
+        return self.records[0] if self.records else None
+
+    def data(self):
+        return list(self.records)
+
+    def consume(self):
+        return SimpleNamespace(counters=SimpleNamespace(properties_set=0))
+
+
+class InMemorySession:
+    def __init__(self, driver: 'InMemoryNeo4j'):
+        self.driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def run(self, query: str, parameters: Optional[Dict] = None, **kwargs) -> InMemoryResult:
+        return self.driver.execute(query, dict(parameters or {}, **kwargs))
+
+    def execute_write(self, func, *args, **kwargs):
+        with self.driver.lock:
+            self.driver.transactions += 1
+        return func(self, *args, **kwargs)
+
+    execute_read = execute_write
+
+    def close(self):
+        pass
+
+
+class InMemoryNeo4j:
+    """
+    Stand-in for a Neo4j driver when no database is available. Statements are
+    not executed, only counted along with the rows they carry, and each one
+    costs `statement_latency` seconds to model the round trip to the server.
+    """
+
+    def __init__(self, statement_latency: float = 0.002):
+        self.statement_latency = statement_latency
+        self.statements = 0
+        self.transactions = 0
+        self.rows = 0
+        self.lock = threading.Lock()
+
+    def session(self, **kwargs) -> InMemorySession:
+        return InMemorySession(self)
+
+    def execute(self, query: str, params: Dict) -> InMemoryResult:
+        with self.lock:
+            self.statements += 1
+            self.rows += len(params.get('rows', ()))
+        time.sleep(self.statement_latency)
+        if query.lstrip().startswith('SHOW INDEXES'):
+            return InMemoryResult([{'name': name, 'state': 'ONLINE'} for name in {**CONSTRAINTS, **INDEXES}])
+        return InMemoryResult([])
+
+    def close(self):
+        pass
+
+
+class PerRowMovieDatabase(MovieDatabase):
+    """
+    Write strategy baseline: one statement per node or relationship instead of
+    one UNWIND per type, still inside a single transaction per batch
+    """
+
+    def write_batch(self, tx, batch: Dict[str, List[Dict]], replace: bool = False):
+        empty = {key: [] for key in batch}
+        for key, rows in batch.items():
+            for row in rows:
+                super().write_batch(tx, dict(empty, **{key: [row]}), replace)
+
+
+STRATEGIES = {
+    'unwind': MovieDatabase,
+    'per-row': PerRowMovieDatabase,
+}
+
+
+def run_benchmark(stub: StubTMDBServer, strategy: str, batch_size: int, concurrency: int,
+                  num_pages: int, rate: float = DEFAULT_BENCHMARK_RATE, use_neo4j: bool = False,
+                  statement_latency: float = 0.002, clear: bool = False) -> Dict:
+    """
+    Run one full update_database against the stub and return its throughput
+    """
+    metrics = IngestMetrics()
+    stand_in = None if use_neo4j else InMemoryNeo4j(statement_latency)
+    db = STRATEGIES[strategy](batch_size=batch_size, concurrency=concurrency, use_cache=False,
+                              metrics=metrics, base_url=stub.base_url, rate=rate, driver=stand_in)
+    try:
+        if clear and use_neo4j:
+            db.clear_database(confirm=False)
+        requests_before = stub.requests
+        start = time.monotonic()
+        db.update_database(num_pages=num_pages)
+        elapsed = time.monotonic() - start
+    finally:
+        db.close()
+
+    report = metrics.report()
+    transactions = report['histograms'].get('neo4j_transaction_seconds{operation="write_batch"}', {})
+    movies = report['movies_written']
+    result = {
+        'strategy': strategy,
+        'batch_size': batch_size,
+        'concurrency': concurrency,
+        'movies': movies,
+        'seconds': round(elapsed, 2),
+        'movies_per_second': round(movies / elapsed, 2) if elapsed else 0.0,
+        'tmdb_requests': stub.requests - requests_before,
+        'write_transactions': transactions.get('count', 0),
+        'write_p95_seconds': transactions.get('p95', 0.0),
+    }
+    if stand_in is not None:
+        result['statements'] = stand_in.statements
+        result['rows'] = stand_in.rows
+    return result
+
+
+def format_table(results: List[Dict]) -> str:
+    columns = ['strategy', 'batch_size', 'concurrency', 'movies', 'seconds', 'movies_per_second',
+               'tmdb_requests', 'write_transactions', 'write_p95_seconds', 'statements']
+    columns = [column for column in columns if any(column in result for result in results)]
+    rows = [[str(result.get(column, '')) for column in columns] for result in results]
+    widths = [max(len(column), *(len(row[i]) for row in rows)) for i, column in enumerate(columns)]
+    lines = ['  '.join(column.ljust(width) for column, width in zip(columns, widths))]
+    lines += ['  '.join(value.ljust(width) for value, width in zip(row, widths)) for row in rows]
+    return '\n'.join(lines)
+
+
+def int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(',') if item]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark update_database against a local TMDB stub, for every combination "
+                    "of batch size, concurrency and write strategy")
+    parser.add_argument('--pages', type=int, default=10, help="listing pages per run (20 movies each)")
+    parser.add_argument('--batch-sizes', type=int_list, default=[20], help="comma-separated, e.g. 1,20,100")
+    parser.add_argument('--concurrency', type=int_list, default=[8], help="comma-separated fetch worker counts")
+    parser.add_argument('--strategies', default='unwind',
+                        help=f"comma-separated write strategies: {', '.join(STRATEGIES)}")
+    parser.add_argument('--latency', type=float, default=0.05, help="stub response latency in seconds")
+    parser.add_argument('--cast-size', type=int, default=20, help="cast members per movie")
+    parser.add_argument('--keywords', type=int, default=10, help="keywords per movie")
+    parser.add_argument('--people', type=int, default=5000, help="size of the pool cast members are drawn from")
+    parser.add_argument('--rate', type=float, default=DEFAULT_BENCHMARK_RATE,
+                        help="client rate limit in requests per second")
+    parser.add_argument('--neo4j', action='store_true',
+                        help="write to the NEO4J_URI2 database instead of the in-memory stand-in "
+                             "(this loads synthetic movies into it)")
+    parser.add_argument('--clear', action='store_true', help="with --neo4j, clear the database before each run")
+    parser.add_argument('--statement-latency', type=float, default=0.002,
+                        help="simulated round trip per statement for the in-memory stand-in")
+    parser.add_argument('--output', help="also write the results to this JSON file")
+    parser.add_argument('--verbose', action='store_true', help="show the loader's own logging")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    strategies = [strategy for strategy in args.strategies.split(',') if strategy]
+    unknown = [strategy for strategy in strategies if strategy not in STRATEGIES]
+    if unknown:
+        parser.error(f"unknown write strategies: {', '.join(unknown)}")
+
+    stub = StubTMDBServer(latency=args.latency, cast_size=args.cast_size,
+                          keyword_count=args.keywords, people=args.people)
+    stub.start()
+    results = []
+    try:
+        for strategy in strategies:
+            for batch_size in args.batch_sizes:
+                for concurrency in args.concurrency:
+                    result = run_benchmark(stub, strategy, batch_size, concurrency, args.pages,
+                                           rate=args.rate, use_neo4j=args.neo4j,
+                                           statement_latency=args.statement_latency, clear=args.clear)
+                    print(json.dumps(result), flush=True)
+                    results.append(result)
+    finally:
+        stub.stop()
+
+    print()
+    print(format_table(results))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'settings': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
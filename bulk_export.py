@@ -0,0 +1,131 @@
+import csv
+import os
+import logging
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Header row and source columns for each file. Node IDs live in one ID space
+# per label because TMDB reuses the same numbers for movies, people, etc.
+NODE_FILES = {
+    'movies': ('Movie', [
+        ('tmdb_id:ID(Movie)', 'tmdb_id'),
+        ('title', 'title'),
+        ('overview', 'overview'),
+        ('release_date:date', 'release_date'),
+        ('release_year:int', 'release_year'),
+        ('vote_average:float', 'vote_average'),
+        ('vote_count:int', 'vote_count'),
+        ('popularity:float', 'popularity'),
+        ('poster_path', 'poster_path'),
+        ('last_updated', 'last_updated'),
+    ]),
+    'people': ('Person', [
+        ('tmdb_id:ID(Person)', 'tmdb_id'),
+        ('name', 'name'),
+        ('profile_path', 'profile_path'),
+        ('last_updated', 'last_updated'),
+    ]),
+    'genres': ('Genre', [
+        ('tmdb_id:ID(Genre)', 'tmdb_id'),
+        ('name', 'name'),
+    ]),
+    'keywords': ('Keyword', [
+        ('tmdb_id:ID(Keyword)', 'tmdb_id'),
+        ('name', 'name'),
+    ]),
+}
+
+RELATIONSHIP_FILES = {
+    'acted_in': ('ACTED_IN', [
+        (':START_ID(Person)', 'person_id'),
+        (':END_ID(Movie)', 'movie_id'),
+        ('character', 'character'),
+    ], ('person_id', 'movie_id')),
+    'directed': ('DIRECTED', [
+        (':START_ID(Person)', 'person_id'),
+        (':END_ID(Movie)', 'movie_id'),
+    ], ('person_id', 'movie_id')),
+    'in_genre': ('IN_GENRE', [
+        (':START_ID(Movie)', 'movie_id'),
+        (':END_ID(Genre)', 'genre_id'),
+    ], ('movie_id', 'genre_id')),
+    'has_keyword': ('HAS_KEYWORD', [
+        (':START_ID(Movie)', 'movie_id'),
+        (':END_ID(Keyword)', 'keyword_id'),
+    ], ('movie_id', 'keyword_id')),
+}
+
+
+class CsvExporter:
+    """
+    Write graph batches (as built by MovieDatabase.collect_batch) to node and
+    relationship CSV files for `neo4j-admin database import full`.
+    Nodes are deduplicated by tmdb_id across the whole export. Only the first
+    copy of a movie is kept, and so are only that copy's relationships.
+    """
+
+    def __init__(self, out_dir: str):
+        self.out_dir = out_dir
+        os.makedirs(out_dir, exist_ok=True)
+        self.files = {}
+        self.writers = {}
+        self.seen = {key: set() for key in NODE_FILES}
+        self.counts = {key: 0 for key in list(NODE_FILES) + list(RELATIONSHIP_FILES)}
+
+        for key, (name, columns) in NODE_FILES.items():
+            self._open(key, name, [header for header, _ in columns] + [':LABEL'])
+        for key, (name, columns, _) in RELATIONSHIP_FILES.items():
+            self._open(key, name, [header for header, _ in columns] + [':TYPE'])
+
+    def _open(self, key: str, name: str, header: List[str]):
+        f = open(os.path.join(self.out_dir, f'{name}.csv'), 'w', newline='', encoding='utf-8')
+        self.files[key] = f
+        self.writers[key] = csv.writer(f)
+        self.writers[key].writerow(header)
+
+    def write_batch(self, batch: Dict[str, List[Dict]]):
+        new_movies = {
+            movie['tmdb_id'] for movie in batch['movies']
+            if movie['tmdb_id'] not in self.seen['movies']
+        }
+        for key, (label, columns) in NODE_FILES.items():
+            seen = self.seen[key]
+            for row in batch[key]:
+                if row['tmdb_id'] in seen:
+                    continue
+                seen.add(row['tmdb_id'])
+                self.writers[key].writerow([row[field] for _, field in columns] + [label])
+                self.counts[key] += 1
+
+        for key, (rel_type, columns, identity) in RELATIONSHIP_FILES.items():
+            written = set()
+            for row in batch[key]:
+                pair = tuple(row[field] for field in identity)
+                if row['movie_id'] not in new_movies or pair in written:
+                    continue
+                written.add(pair)
+                self.writers[key].writerow([row[field] for _, field in columns] + [rel_type])
+                self.counts[key] += 1
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        logger.info(f"Exported CSVs to {self.out_dir}: {self.counts}")
+
+    def import_command(self, database: str = 'neo4j') -> str:
+        """
+        The neo4j-admin command that loads the exported files into `database`
+        """
+        nodes = ' '.join(
+            f'--nodes={os.path.join(self.out_dir, label)}.csv'
+            for label, _ in NODE_FILES.values()
+        )
+        relationships = ' '.join(
+            f'--relationships={os.path.join(self.out_dir, rel_type)}.csv'
+            for rel_type, _, _ in RELATIONSHIP_FILES.values()
+        )
+        return (
+            f'neo4j-admin database import full {database} --overwrite-destination '
+            f'--id-type=integer --multiline-fields=true {nodes} {relationships}'
+        )
@@ -0,0 +1,121 @@
+import json
+import os
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT_PATH = os.getenv('INGEST_CHECKPOINT_PATH', '.ingest_checkpoint.json')
+
+
+class IngestCheckpoint:
+    """
+    Durable record of an ingestion run: which listing pages are done, which
+    movie IDs have been committed to Neo4j and which failed and need a retry.
+    Saved to a JSON file after every change so a crashed run can resume.
+    """
+
+    def __init__(self, path: str = DEFAULT_CHECKPOINT_PATH, num_pages: int = 0,
+                 track_committed: bool = True):
+        self.path = path
+        self.num_pages = num_pages
+        # Off for runs fed movie IDs that never repeat (e.g. an ID export),
+        # where keeping every committed ID would grow without bound
+        self.track_committed = track_committed
+        self.started = datetime.now().isoformat()
+        self.completed_pages = set()
+        self.page_ids: Dict[int, List[int]] = {}
+        self.committed = set()
+        self.failed = set()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_CHECKPOINT_PATH) -> Optional['IngestCheckpoint']:
+        """
+        Load a checkpoint from `path`, or return None if there isn't one
+        """
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            data = json.load(f)
+        checkpoint = cls(path, data['num_pages'], data.get('track_committed', True))
+        checkpoint.started = data['started']
+        checkpoint.completed_pages = set(data['completed_pages'])
+        checkpoint.page_ids = {int(page): ids for page, ids in data['page_ids'].items()}
+        checkpoint.committed = set(data['committed'])
+        checkpoint.failed = set(data['failed'])
+        return checkpoint
+
+    def save(self):
+        with self.lock:
+            self._save()
+
+    def _save(self):
+        data = {
+            'num_pages': self.num_pages,
+            'track_committed': self.track_committed,
+            'started': self.started,
+            'completed_pages': sorted(self.completed_pages),
+            'page_ids': self.page_ids,
+            'committed': sorted(self.committed),
+            'failed': sorted(self.failed)
+        }
+        # Write then rename so a crash mid-write never leaves a corrupt file
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def pending_pages(self) -> List[int]:
+        return [page for page in range(1, self.num_pages + 1) if page not in self.completed_pages]
+
+    def is_committed(self, movie_id: int) -> bool:
+        with self.lock:
+            return movie_id in self.committed
+
+    def take_failed(self) -> List[int]:
+        """
+        Return the retry list and clear it; IDs that fail again are re-added
+        """
+        with self.lock:
+            failed = sorted(self.failed)
+            self.failed.clear()
+            self._save()
+        return failed
+
+    def page_listed(self, page: int, movie_ids: Iterable[int]):
+        with self.lock:
+            self.page_ids[page] = list(movie_ids)
+            self._update_pages()
+            self._save()
+
+    def mark_committed(self, movie_ids: Iterable[int]):
+        with self.lock:
+            if not self.track_committed:
+                self.failed.difference_update(movie_ids)
+                self._save()
+                return
+            self.committed.update(movie_ids)
+            self.failed.difference_update(self.committed)
+            self._update_pages()
+            self._save()
+
+    def mark_failed(self, movie_ids: Iterable[int]):
+        with self.lock:
+            self.failed.update(movie_ids)
+            self._update_pages()
+            self._save()
+
+    def _update_pages(self):
+        # A page is finished once every movie on it was committed or queued for retry
+        done = self.committed | self.failed
+        for page, ids in list(self.page_ids.items()):
+            if done.issuperset(ids):
+                self.completed_pages.add(page)
+                del self.page_ids[page]
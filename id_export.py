@@ -0,0 +1,34 @@
+import gzip
+import json
+import logging
+from typing import Iterator
+
+logger = logging.getLogger(__name__)
+
+
+def read_id_export(path: str, min_popularity: float = 0.0, include_adult: bool = False) -> Iterator[int]:
+    """
+    Stream movie IDs from one of TMDB's gzipped daily ID export files
+    (e.g. movie_ids_10_18_2026.json.gz), one JSON object per line.
+    Only one line is held in memory at a time.
+    """
+    kept = 0
+    skipped = 0
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                skipped += 1
+                continue
+            if entry.get('adult') and not include_adult:
+                skipped += 1
+                continue
+            if (entry.get('popularity') or 0.0) < min_popularity:
+                skipped += 1
+                continue
+            kept += 1
+            yield entry['id']
+    logger.info(f"Read {kept} movie IDs from {path}, skipped {skipped}")
@@ -0,0 +1,236 @@
+import json
+import os
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, Prometheus style
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float('inf'))
+
+QUEUE_SAMPLE_INTERVAL = 1.0
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """
+        Upper bound of the bucket holding the q-th observation
+        """
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return self.max if bound == float('inf') else bound
+        return self.max
+
+    def summary(self) -> Dict:
+        return {
+            'count': self.count,
+            'mean': round(self.sum / self.count, 4) if self.count else 0.0,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'max': round(self.max, 4),
+        }
+
+
+def _key(name: str, labels: Dict) -> Tuple:
+    return (name, tuple(sorted(labels.items())))
+
+
+def _format_labels(labels: Tuple, extra: str = '') -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class IngestMetrics:
+    """
+    Thread-safe counters, gauges and latency histograms for an ingestion run.
+    Produces a JSON report at the end of the run and, optionally, Prometheus
+    text exposition on an HTTP port or in a file refreshed while running.
+    """
+
+    def __init__(self, report_path: Optional[str] = None, prometheus_file: Optional[str] = None,
+                 port: Optional[int] = None):
+        self.report_path = report_path
+        self.prometheus_file = prometheus_file
+        self.port = port
+        self.started = time.monotonic()
+        self.counters: Dict[Tuple, float] = {}
+        self.gauges: Dict[Tuple, float] = {}
+        self.histograms: Dict[Tuple, Histogram] = {}
+        self.lock = threading.Lock()
+        self.server = None
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self.lock:
+            self.gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _key(name, labels)
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - start, **labels)
+
+    @contextmanager
+    def sampling(self, queue_depths: Callable[[], Dict[str, int]]):
+        """
+        Sample pipeline queue depths every second while the block runs,
+        recording the current and peak depth per stage
+        """
+        stop = threading.Event()
+
+        def sample():
+            while not stop.wait(QUEUE_SAMPLE_INTERVAL):
+                for stage, depth in queue_depths().items():
+                    self.set_gauge('pipeline_queue_depth', depth, stage=stage)
+                    peak = _key('pipeline_queue_depth_max', {'stage': stage})
+                    with self.lock:
+                        self.gauges[peak] = max(self.gauges.get(peak, 0), depth)
+                if self.prometheus_file:
+                    self.write_prometheus_file()
+
+        thread = threading.Thread(target=sample, name='queue-sampler', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def counter(self, name: str, **labels) -> float:
+        with self.lock:
+            if labels:
+                return self.counters.get(_key(name, labels), 0)
+            return sum(value for (n, _), value in self.counters.items() if n == name)
+
+    def report(self) -> Dict:
+        """
+        Everything recorded so far as a JSON-serialisable dict
+        """
+        elapsed = time.monotonic() - self.started
+        with self.lock:
+            counters = {
+                name + _format_labels(labels): value for (name, labels), value in sorted(self.counters.items())
+            }
+            gauges = {
+                name + _format_labels(labels): value for (name, labels), value in sorted(self.gauges.items())
+            }
+            histograms = {
+                name + _format_labels(labels): hist.summary()
+                for (name, labels), hist in sorted(self.histograms.items())
+            }
+        movies = self.counter('movies_written_total')
+        return {
+            'elapsed_seconds': round(elapsed, 2),
+            'movies_written': movies,
+            'movies_per_second': round(movies / elapsed, 2) if elapsed else 0.0,
+            'counters': counters,
+            'gauges': gauges,
+            'histograms': histograms,
+        }
+
+    def prometheus_text(self) -> str:
+        lines = []
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+            for (name, labels), value in sorted(self.gauges.items()):
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+            for (name, labels), hist in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(hist.buckets, hist.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else bound
+                    bucket_labels = _format_labels(labels, f'le="{le}"')
+                    lines.append(f'{name}_bucket{bucket_labels} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {hist.sum}')
+                lines.append(f'{name}_count{_format_labels(labels)} {hist.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus_file(self):
+        tmp_path = f'{self.prometheus_file}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.prometheus_text())
+        # Rename so node_exporter's textfile collector never reads a partial file
+        os.replace(tmp_path, self.prometheus_file)
+
+    def start(self):
+        """
+        Start the Prometheus HTTP endpoint if a port was given
+        """
+        if self.port is None:
+            return
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('', self.port), Handler)
+        threading.Thread(target=self.server.serve_forever, name='metrics-http', daemon=True).start()
+        logger.info(f"Serving Prometheus metrics on port {self.port}")
+
+    def stop(self):
+        """
+        Stop the HTTP endpoint and write the final report and metrics file
+        """
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
+        if self.prometheus_file:
+            self.write_prometheus_file()
+        report = self.report()
+        if self.report_path:
+            with open(self.report_path, 'w') as f:
+                json.dump(report, f, indent=2)
+            logger.info(f"Wrote ingestion metrics report to {self.report_path}")
+        logger.info(
+            f"Ingestion metrics: {report['movies_written']} movies in {report['elapsed_seconds']}s "
+            f"({report['movies_per_second']} movies/s)"
+        )
@@ -0,0 +1,123 @@
+import queue
+import threading
+import logging
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 100
+
+# Marks the end of a stage's input
+_DONE = object()
+
+
+class Stage:
+    """
+    One step of a pipeline: `workers` threads take items from a bounded
+    input queue and pass them to `func`, which returns an iterable of items
+    for the next stage. With `batch_size`, `func` receives lists of up to
+    that many items instead of single items.
+    """
+
+    def __init__(self, name: str, func: Callable, workers: int = 1,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, batch_size: Optional[int] = None):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.input = queue.Queue(maxsize=queue_size)
+        self.processed = 0
+        self.failed = 0
+        self._running = self.workers
+        self._lock = threading.Lock()
+
+
+class Pipeline:
+    """
+    Chain of stages connected by bounded queues. A full queue blocks the
+    stage feeding it, so a slow stage applies backpressure upstream and the
+    number of items in flight never exceeds the sum of the queue sizes.
+    """
+
+    def __init__(self):
+        self.stages: List[Stage] = []
+
+    def add_stage(self, name: str, func: Callable, workers: int = 1,
+                  queue_size: int = DEFAULT_QUEUE_SIZE, batch_size: Optional[int] = None) -> 'Pipeline':
+        self.stages.append(Stage(name, func, workers, queue_size, batch_size))
+        return self
+
+    def queue_depths(self) -> Dict[str, int]:
+        return {stage.name: stage.input.qsize() for stage in self.stages}
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            stage.name: {'processed': stage.processed, 'failed': stage.failed}
+            for stage in self.stages
+        }
+
+    def run(self, source: Iterable):
+        """
+        Feed `source` into the first stage and block until every stage has
+        drained. Items returned by the last stage are discarded. If `source`
+        raises, what it produced so far is still drained through every stage
+        before the error is re-raised.
+        """
+        threads = []
+        for index, stage in enumerate(self.stages):
+            downstream = self.stages[index + 1] if index + 1 < len(self.stages) else None
+            for n in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._work, args=(stage, downstream),
+                    name=f'{stage.name}-{n}', daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        first = self.stages[0]
+        try:
+            for item in source:
+                first.input.put(item)
+        finally:
+            for _ in range(first.workers):
+                first.input.put(_DONE)
+            for thread in threads:
+                thread.join()
+
+    def _work(self, stage: Stage, downstream: Optional[Stage]):
+        done = False
+        while not done:
+            item = stage.input.get()
+            if item is _DONE:
+                break
+            if stage.batch_size:
+                items = [item]
+                while len(items) < stage.batch_size:
+                    item = stage.input.get()
+                    if item is _DONE:
+                        done = True
+                        break
+                    items.append(item)
+                item = items
+
+            try:
+                outputs = stage.func(item) or ()
+                with stage._lock:
+                    stage.processed += 1
+            except Exception as e:
+                with stage._lock:
+                    stage.failed += 1
+                logger.error(f"Error in {stage.name} stage: {str(e)}")
+                continue
+
+            if downstream is not None:
+                for output in outputs:
+                    downstream.input.put(output)
+
+        # The last worker out tells the next stage there is nothing more to come
+        with stage._lock:
+            stage._running -= 1
+            last = stage._running == 0
+        if last and downstream is not None:
+            for _ in range(downstream.workers):
+                downstream.input.put(_DONE)
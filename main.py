@@ -2,6 +2,8 @@ import requests
 import json
 import os
 import dotenv
+from tmdb_client import TMDBClient
+from response_cache import ResponseCache
 
 # Load environment variables
 dotenv.load_dotenv()
@@ -10,27 +12,23 @@ access_token = os.getenv('TMDB_ACCESS_TOKEN')  # Make sure to have this in your
 # API endpoint base URL
 base_url = 'https://api.themoviedb.org/3'
 
+# Responses are cached on disk, so repeated lookups don't hit the API
+client = TMDBClient(access_token, base_url=base_url, concurrency=1, cache=ResponseCache())
+
 def get_movie_details(movie_id):
     """
     Fetch movie details from TMDB API using Bearer token authentication
     """
-    headers = {
-        'Authorization': f'Bearer {access_token}',
-        'accept': 'application/json'
-    }
-    
-    url = f'{base_url}/search/movie?query=Batman'
-    response = requests.get(url, headers=headers)
-    
-    if response.status_code == 200:
-        data = response.json()
-        # Find the specific movie in results
-        for movie in data['results']:
-            if movie['id'] == movie_id:
-                return movie
-        raise Exception(f"Movie with ID {movie_id} not found in results")
-    else:
-        raise Exception(f"Error fetching movie details: {response.status_code} - {response.text}")
+    try:
+        data = client.get('/search/movie', {'query': 'Batman'})
+    except requests.HTTPError as e:
+        raise Exception(f"Error fetching movie details: {e.response.status_code} - {e.response.text}")
+
+    # Find the specific movie in results
+    for movie in data['results']:
+        if movie['id'] == movie_id:
+            return movie
+    raise Exception(f"Movie with ID {movie_id} not found in results")
 
 def get_movie_poster(movie_id):
     """
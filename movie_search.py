@@ -0,0 +1,144 @@
+import re
+from datetime import date
+from typing import Optional, Tuple
+
+# Full-text index over Movie.title, created by schema.py
+TITLE_INDEX = 'movie_title_fulltext'
+
+
+def lucene_title_query(search_term: str) -> str:
+    """
+    Turn what the user typed into a Lucene query for TITLE_INDEX.
+    Every word must match, exactly (boosted), as a prefix, or, for words of
+    four letters or more, within one or two typos. Case is ignored.
+    Returns '' if there is nothing searchable in `search_term`.
+    """
+    clauses = []
+    for word in re.findall(r'\w+', search_term.lower()):
+        options = [f'{word}^3', f'{word}*^2']
+        if len(word) >= 4:
+            options.append(f'{word}~{1 if len(word) < 7 else 2}')
+        clauses.append(f"({' OR '.join(options)})")
+    return ' AND '.join(clauses)
+
+
+# Sort expression and direction for each sort option on the Movie Search page.
+# Ties are broken by tmdb_id so every row has a unique position for paging.
+SORTS = {
+    "Relevance": ('score', 'DESC'),
+    "Release Date (Newest)": ('m.release_date', 'DESC'),
+    "Release Date (Oldest)": ('m.release_date', 'ASC'),
+    "Rating (Highest)": ('m.vote_average', 'DESC'),
+    "Rating (Lowest)": ('m.vote_average', 'ASC'),
+}
+
+# Range index each browse sort is read from. Seeking on the sort property
+# returns rows already in order, so Neo4j stops after the first page instead
+# of sorting every match.
+SORT_INDEXES = {
+    "Release Date (Newest)": 'release_date',
+    "Release Date (Oldest)": 'release_date',
+    "Rating (Highest)": 'vote_average',
+    "Rating (Lowest)": 'vote_average',
+}
+
+PAGE_SIZE = 15
+
+# Only what a result card shows; overviews are fetched with OVERVIEWS_QUERY
+CARD_FIELDS = """m.tmdb_id as tmdb_id,
+           m.title as title,
+           m.release_date as release_date,
+           m.vote_average as rating,
+           m.poster_path as poster,
+           m.vote_count as vote_count"""
+
+OVERVIEWS_QUERY = """
+MATCH (m:Movie)
+WHERE m.tmdb_id IN $ids
+RETURN m.tmdb_id AS tmdb_id, m.overview AS overview
+"""
+
+
+def filter_params(min_rating: float, year_range) -> dict:
+    """
+    Query parameters for the rating and year filters. Years are also given
+    as a half-open date range so release_date can be range-seeked.
+    """
+    start_year, end_year = year_range
+    return {
+        'min_rating': min_rating,
+        'start_year': start_year,
+        'end_year': end_year,
+        'start_date': date(start_year, 1, 1),
+        'end_date': date(end_year + 1, 1, 1),
+    }
+
+
+def cursor_params(cursor: Optional[Tuple]) -> dict:
+    """
+    Parameters for the page after `cursor`, the (sort value, tmdb_id) of
+    the last row of the previous page
+    """
+    if cursor is None:
+        return {}
+    return {'after_value': cursor[0], 'after_id': cursor[1]}
+
+
+def next_cursor(row: dict) -> Tuple:
+    return row['sort_value'], row['tmdb_id']
+
+
+def _keyset(sort: str, after: bool) -> Tuple[str, str]:
+    """
+    Keyset condition and ORDER BY for `sort`. The inclusive bound on the
+    sort value narrows the index seek itself, so a deep page costs the same
+    as the first one; the tmdb_id comparison then resolves ties.
+    """
+    key, direction = SORTS[sort]
+    op = '<' if direction == 'DESC' else '>'
+    condition = ''
+    if after:
+        condition = (f"AND {key} {op}= $after_value "
+                     f"AND ({key} {op} $after_value OR m.tmdb_id {op} $after_id)")
+    return condition, f"ORDER BY {key} {direction}, m.tmdb_id {direction}"
+
+
+def browse_query(sort: str, after: bool = False) -> str:
+    """
+    One page of movies passing the filters, in `sort` order, answered from
+    that sort's index. With `after`, the page follows cursor_params' cursor.
+    Returns PAGE_SIZE + 1 rows at most; the extra one means there's a next page.
+    """
+    condition, order = _keyset(sort, after)
+    return f"""
+    MATCH (m:Movie)
+    USING INDEX m:Movie({SORT_INDEXES[sort]})
+    WHERE m.vote_average >= $min_rating
+    AND m.release_date >= $start_date AND m.release_date < $end_date
+    {condition}
+    RETURN {CARD_FIELDS},
+           {SORTS[sort][0]} as sort_value
+    {order}
+    LIMIT {PAGE_SIZE + 1}
+    """
+
+
+def title_search_query(sort: str, after: bool = False) -> str:
+    """
+    One page of title index hits passing the filters, in `sort` order, like
+    browse_query. Every hit is considered: the year filter always drops part
+    of them, so capping the index call would leave pages incomplete and
+    later pages unreachable.
+    """
+    condition, order = _keyset(sort, after)
+    return f"""
+    CALL db.index.fulltext.queryNodes($index, $lucene_query)
+    YIELD node AS m, score
+    WHERE m.vote_average >= $min_rating
+    AND m.release_year >= $start_year AND m.release_year <= $end_year
+    {condition}
+    RETURN {CARD_FIELDS},
+           {SORTS[sort][0]} as sort_value
+    {order}
+    LIMIT {PAGE_SIZE + 1}
+    """
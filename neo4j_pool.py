@@ -0,0 +1,86 @@
+import os
+import time
+import atexit
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Dict, Tuple
+
+from neo4j import GraphDatabase
+
+logger = logging.getLogger(__name__)
+
+# Connection pool settings, overridable from the environment
+DEFAULT_POOL_SIZE = int(os.getenv('NEO4J_POOL_SIZE', '50'))
+# Seconds to wait for a free connection before a query fails
+DEFAULT_ACQUISITION_TIMEOUT = float(os.getenv('NEO4J_ACQUISITION_TIMEOUT', '30'))
+# Connections idle for longer than this are pinged before reuse, so one
+# dropped by a load balancer or server restart never fails a query
+DEFAULT_LIVENESS_TIMEOUT = float(os.getenv('NEO4J_LIVENESS_TIMEOUT', '30'))
+DEFAULT_MAX_LIFETIME = float(os.getenv('NEO4J_MAX_CONNECTION_LIFETIME', '3600'))
+
+
+class PooledDriver:
+    """
+    Long-lived Neo4j driver meant to be created once per process and shared
+    by every Streamlit session and rerun, so connections, TLS and auth are
+    set up once and then reused from the pool. Drop-in for the driver's
+    session(); also counts how the pool is used (see stats).
+    """
+
+    def __init__(self, uri: str, auth: Tuple[str, str], pool_size: int = DEFAULT_POOL_SIZE,
+                 acquisition_timeout: float = DEFAULT_ACQUISITION_TIMEOUT,
+                 liveness_timeout: float = DEFAULT_LIVENESS_TIMEOUT,
+                 max_lifetime: float = DEFAULT_MAX_LIFETIME):
+        self.pool_size = pool_size
+        self.driver = GraphDatabase.driver(
+            uri,
+            auth=auth,
+            max_connection_pool_size=pool_size,
+            connection_acquisition_timeout=acquisition_timeout,
+            liveness_check_timeout=liveness_timeout,
+            max_connection_lifetime=max_lifetime,
+        )
+        self.counts = {'sessions': 0, 'errors': 0, 'in_use': 0, 'peak_in_use': 0}
+        self.session_seconds = 0.0
+        self.created = time.monotonic()
+        self.lock = threading.Lock()
+        atexit.register(self.close)
+        logger.info(f"Created Neo4j driver for {uri} with a pool of {pool_size} connections")
+
+    @contextmanager
+    def session(self, **kwargs):
+        """
+        A session on a pooled connection. A session holds at most one
+        connection, so sessions open at once bound the connections in use.
+        """
+        with self.lock:
+            self.counts['sessions'] += 1
+            self.counts['in_use'] += 1
+            self.counts['peak_in_use'] = max(self.counts['peak_in_use'], self.counts['in_use'])
+        start = time.monotonic()
+        try:
+            with self.driver.session(**kwargs) as session:
+                yield session
+        except Exception:
+            with self.lock:
+                self.counts['errors'] += 1
+            raise
+        finally:
+            with self.lock:
+                self.counts['in_use'] -= 1
+                self.session_seconds += time.monotonic() - start
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return dict(
+                self.counts,
+                pool_size=self.pool_size,
+                utilization=round(self.counts['in_use'] / self.pool_size, 3) if self.pool_size else 0.0,
+                avg_session_ms=round(self.session_seconds / self.counts['sessions'] * 1000, 1)
+                if self.counts['sessions'] else 0.0,
+                uptime_seconds=round(time.monotonic() - self.created),
+            )
+
+    def close(self):
+        self.driver.close()
@@ -1,12 +1,31 @@
-import requests
+import argparse
 import json
 import os
+import re
+import socket
+import sys
+import tempfile
+import threading
 import time
-from datetime import datetime
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
 from neo4j import GraphDatabase
 from dotenv import load_dotenv
 import logging
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+from tmdb_client import TMDBClient, DEFAULT_CONCURRENCY, DEFAULT_RATE
+from response_cache import ResponseCache
+from ingest_pipeline import Pipeline, DEFAULT_QUEUE_SIZE
+from checkpoint import IngestCheckpoint
+from snapshot import SnapshotWriter, read_snapshot
+from bulk_export import CsvExporter
+from schema import ensure_schema, run_migrations
+from id_export import read_id_export
+from ingest_metrics import IngestMetrics
+from similarity import update_similarities, rebuild_similarities, NORMALIZED_RATING, DEFAULT_TOP_K
+from analytics import update_analytics, rebuild_analytics
+from work_queue import (WorkQueue, chunked, DEFAULT_LEASE_SECONDS, DEFAULT_PAGES_PER_SHARD,
+                        DEFAULT_IDS_PER_SHARD)
 
 # Logging setup
 logging.basicConfig(level=logging.INFO)
@@ -19,25 +38,115 @@ neo4j_uri = os.getenv('NEO4J_URI2')
 neo4j_user = os.getenv('NEO4J_USER2')
 neo4j_password = os.getenv('NEO4J_PASSWORD2')
 
+TMDB_BASE_URL = 'https://api.themoviedb.org/3'
+
+# Number of movies collected before their nodes and relationships are flushed
+# to Neo4j. One TMDB listing page holds 20 movies.
+DEFAULT_BATCH_SIZE = 20
+
+# Worker threads per ingestion stage. 'fetch' defaults to the client concurrency.
+DEFAULT_STAGE_WORKERS = {'list': 2, 'transform': 1, 'write': 1}
+
+# Nodes or relationships removed per transaction by clear_database
+DEFAULT_DELETE_BATCH_SIZE = 10000
+
+# TMDB's change feeds accept at most 14 days per request
+CHANGES_WINDOW_DAYS = 14
+
+# Snapshot paths holding movie and person detail payloads
+MOVIE_DETAILS_PATH = re.compile(r'^/movie/\d+$')
+PERSON_DETAILS_PATH = re.compile(r'^/person/\d+$')
+
+# Person, Genre and Keyword ids remembered per type as already written in a
+# run. Forgetting one only costs a redundant MERGE of that node.
+DEFAULT_WRITTEN_CACHE_SIZE = int(os.getenv('WRITTEN_CACHE_SIZE', '200000'))
+
+# How long a sharded worker waits before looking for work again while other
+# workers still hold leases
+WORKER_POLL_SECONDS = 10
+
+class RecentIds:
+    """
+    Set of the `max_size` most recently added or looked-up ids; older ones
+    are forgotten first. Not thread-safe; callers hold their own lock.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_WRITTEN_CACHE_SIZE):
+        self.max_size = max_size
+        self.ids: 'OrderedDict[int, None]' = OrderedDict()
+
+    def __contains__(self, item: int) -> bool:
+        if item in self.ids:
+            self.ids.move_to_end(item)
+            return True
+        return False
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def update(self, items: Iterable[int]):
+        for item in items:
+            self.ids[item] = None
+            self.ids.move_to_end(item)
+        while len(self.ids) > self.max_size:
+            self.ids.popitem(last=False)
+
+    def clear(self):
+        self.ids.clear()
+
+
 class MovieDatabase:
-    def __init__(self):
-        self.base_url = 'https://api.themoviedb.org/3'
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE, concurrency: int = DEFAULT_CONCURRENCY,
+                 use_cache: bool = True, stage_workers: Optional[Dict[str, int]] = None,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, snapshot_path: Optional[str] = None,
+                 metrics: Optional[IngestMetrics] = None, base_url: str = TMDB_BASE_URL,
+                 rate: float = DEFAULT_RATE, driver=None, maintain_similarities: bool = True,
+                 maintain_analytics: bool = True, written_cache_size: int = DEFAULT_WRITTEN_CACHE_SIZE):
+        self.base_url = base_url
         self.headers = {
             'Authorization': f'Bearer {access_token}',
             'accept': 'application/json'
         }
-        self.driver = GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
+        self.batch_size = batch_size
+        self.stage_workers = dict(DEFAULT_STAGE_WORKERS, fetch=concurrency, **(stage_workers or {}))
+        self.queue_size = queue_size
+        # Keep SIMILAR_TO relationships up to date as movies are written
+        self.maintain_similarities = maintain_similarities
+        self.similar_top_k = DEFAULT_TOP_K
+        # Keep the Analytics Dashboard's stats and leaderboards up to date too
+        self.maintain_analytics = maintain_analytics
+        # Person, Genre and Keyword ids already upserted during the current run
+        # (bounded, so memory stays flat on full-catalog loads)
+        self.written_nodes = {key: RecentIds(written_cache_size) for key in ('people', 'genres', 'keywords')}
+        self.written_lock = threading.Lock()
+        # Batches committed during the current run
+        self.committed_batches = 0
+        self.cache = ResponseCache() if use_cache else None
+        self.snapshot = SnapshotWriter(snapshot_path) if snapshot_path else None
+        self.metrics = metrics if metrics is not None else IngestMetrics()
+        self.client = TMDBClient(access_token, base_url=self.base_url, concurrency=concurrency,
+                                 rate=rate, cache=self.cache, snapshot=self.snapshot, metrics=self.metrics)
+        # An already-built driver (or stand-in) can be passed, e.g. by benchmark.py
+        self.driver = driver or GraphDatabase.driver(neo4j_uri, auth=(neo4j_user, neo4j_password))
 
     def close(self):
         ''' 
         Close The Neo4j driver connection
         '''
         self.driver.close()
+        if self.cache is not None:
+            logger.info(f"Response cache stats: {self.cache.stats()}")
+            self.cache.close()
+        if self.snapshot is not None:
+            self.snapshot.close()
+        self.metrics.stop()
 
-    def clear_database(self):
+    def clear_database(self, confirm: bool = True, batch_size: int = DEFAULT_DELETE_BATCH_SIZE):
         """
         Clear all nodes and relationships from the database.
-        Includes a safety check requiring confirmation.
+        Includes a safety check requiring confirmation unless `confirm` is False.
+        Deletes in transactions of at most `batch_size` relationships or nodes,
+        so large graphs don't exhaust transaction memory or hold long locks.
         """
         try:
             with self.driver.session() as session:
@@ -47,200 +156,961 @@ class MovieDatabase:
                 node_count = result["count"] if result else 0
                 
                 logger.info(f"About to delete {node_count} nodes and all relationships")
-                confirmation = input(f"Are you sure you want to delete all {node_count} nodes and relationships? (yes/no): ")
-                
-                if confirmation.lower() == 'yes':
-                    session.run("MATCH (n) DETACH DELETE n")
-                    logger.info("Database cleared successfully")
-                else:
-                    logger.info("Database clear operation cancelled")
+                if confirm:
+                    confirmation = input(f"Are you sure you want to delete all {node_count} nodes and relationships? (yes/no): ")
+                    if confirmation.lower() != 'yes':
+                        logger.info("Database clear operation cancelled")
+                        return
+
+                # Relationships first, so no single node delete has to detach thousands of them
+                self._delete_in_chunks(
+                    session, "MATCH ()-[r]->() WITH r LIMIT $limit DELETE r RETURN count(r) AS deleted",
+                    'relationships', batch_size
+                )
+                self._delete_in_chunks(
+                    session, "MATCH (n) WITH n LIMIT $limit DETACH DELETE n RETURN count(n) AS deleted",
+                    'nodes', batch_size
+                )
+                self.bump_data_version(session)
+                logger.info("Database cleared successfully")
         except Exception as e:
             logger.error(f"Error clearing database: {str(e)}")
 
+    def _delete_in_chunks(self, session, query: str, what: str, batch_size: int):
+        total = 0
+        while True:
+            deleted = session.run(query, limit=batch_size).single()['deleted']
+            if deleted == 0:
+                return
+            total += deleted
+            logger.info(f"Deleted {total} {what} so far")
+
+    def fetch_popular_page(self, page: int) -> List[Dict]:
+        """
+        Fetch a single page of popular movies, returning an empty list on error
+        """
+        try:
+            data = self.client.get('/movie/popular', {'language': 'en-US', 'page': page})
+            logger.info(f'Fetched page {page} of popular movies')
+            return data['results']
+        except Exception as e:
+            logger.error(f'Error fetching page {page}: {str(e)}')
+            return []
+
     def fetch_popular_movies(self, num_pages:int=10):
         """
         Fetch popular movies from TMDB API
         """
         all_movies = []
-        for page in range(1, num_pages + 1):
-            try:
-                url = f'{self.base_url}/movie/popular?language=en-US&page={page}'
-                response = requests.get(url, headers=self.headers)
-                response.raise_for_status()
-                data = response.json()
-                all_movies.extend(data['results'])
-                logger.info(f'Fetched page {page} of popular movies')
-                time.sleep(0.25)
-            except Exception as e:
-                logger.error(f'Error fetching page {page}: {str(e)}')
+        for results in self.client.map(self.fetch_popular_page, range(1, num_pages + 1)):
+            all_movies.extend(results)
         return all_movies
         
-    def fetch_movie_details(self, movie_id):
+    def fetch_movie_details(self, movie_id, refresh: bool = False):
         '''
-        Fetch detailed information for a specific movie
+        Fetch detailed information for a specific movie.
+        `refresh` skips the response cache's freshness check.
         '''
         try:
-            url = f'{self.base_url}/movie/{movie_id}?append_to_response=credits,keywords'
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
-            return response.json()
+            return self.client.get(f'/movie/{movie_id}', {'append_to_response': 'credits,keywords'},
+                                   refresh=refresh)
         except Exception as e:
             logger.error(f"Error fetching details for movie {movie_id}: {str(e)}")
             return None
+
+    def fetch_many_movie_details(self, movie_ids: Iterable[int],
+                                 refresh: bool = False) -> Iterator[Optional[Dict]]:
+        '''
+        Fetch details for many movies concurrently, yielding them in input order.
+        Failed fetches yield None, like fetch_movie_details.
+        '''
+        return self.client.map(lambda movie_id: self.fetch_movie_details(movie_id, refresh), movie_ids)
         
-    def create_movie_node(self, tx, movie_data):
+    def collect_batch(self, details_list: List[Dict]) -> Dict[str, List[Dict]]:
         """
-        Create or update a movie node in Neo4j
+        Turn a list of TMDB movie details into parameter lists for the batched
+        UNWIND writes, one list per node and relationship type.
+        People, genres and keywords are deduplicated within the batch.
         """
-        query = """
-        MERGE (m:Movie {tmdb_id: $tmdb_id})
-        SET 
-            m.title = $title,
-            m.overview = $overview,
-            m.release_date = $release_date,
-            m.vote_average = $vote_average,
-            m.vote_count = $vote_count,
-            m.popularity = $popularity,
-            m.poster_path = $poster_path,
-            m.last_updated = $last_updated
-        """
-        tx.run(query, {
-            'tmdb_id': movie_data['id'],
-            'title': movie_data['title'],
-            'overview': movie_data['overview'],
-            'release_date': movie_data['release_date'],
-            'vote_average': movie_data['vote_average'],
-            'vote_count': movie_data['vote_count'],
-            'popularity': movie_data['popularity'],
-            'poster_path': movie_data.get('poster_path', ''),
-            'last_updated': datetime.now().isoformat()
-        })
-
-    def create_person_node(self, tx, person_data: Dict, role: str):
-        """
-        Create or update a person node (actor/director) in Neo4j
-        """
-        query = """
-        MERGE (p:Person {tmdb_id: $tmdb_id})
-        SET 
-            p.name = $name,
-            p.profile_path = $profile_path,
-            p.last_updated = $last_updated
-        """
-        tx.run(query, {
-            'tmdb_id': person_data['id'],
-            'name': person_data['name'],
-            'profile_path': person_data.get('profile_path', ''),
-            'last_updated': datetime.now().isoformat()
-        })
-
-        # Create relationship based on role
-        if role == 'ACTED_IN':
-            query = """
-            MATCH (p:Person {tmdb_id: $person_id})
-            MATCH (m:Movie {tmdb_id: $movie_id})
-            MERGE (p)-[r:ACTED_IN]->(m)
-            SET r.character = $character
-            """
-            tx.run(query, {
-                'person_id': person_data['id'],
-                'movie_id': person_data['movie_id'],
-                'character': person_data.get('character', '')
-            })
-        elif role == 'DIRECTED':
-            query = """
-            MATCH (p:Person {tmdb_id: $person_id})
-            MATCH (m:Movie {tmdb_id: $movie_id})
-            MERGE (p)-[r:DIRECTED]->(m)
-            """
-            tx.run(query, {
-                'person_id': person_data['id'],
-                'movie_id': person_data['movie_id']
+        now = datetime.now().isoformat()
+        movies = []
+        people = {}
+        genres = {}
+        keywords = {}
+        acted_in = []
+        directed = []
+        in_genre = []
+        has_keyword = []
+
+        for details in details_list:
+            movie_id = details['id']
+            movies.append({
+                'tmdb_id': movie_id,
+                'title': details['title'],
+                'overview': details['overview'],
+                'release_date': details['release_date'],
+                'release_year': int(details['release_date'][:4]) if details.get('release_date') else None,
+                'vote_average': details['vote_average'],
+                'vote_count': details['vote_count'],
+                'popularity': details['popularity'],
+                'poster_path': details.get('poster_path', ''),
+                'last_updated': now
             })
 
-    def create_genre_node(self, tx, genre, movie_id):
+            for genre in details.get('genres', []):
+                genres[genre['id']] = {'tmdb_id': genre['id'], 'name': genre['name']}
+                in_genre.append({'movie_id': movie_id, 'genre_id': genre['id']})
+
+            for keyword in details.get('keywords', {}).get('keywords', []):
+                keywords[keyword['id']] = {'tmdb_id': keyword['id'], 'name': keyword['name']}
+                has_keyword.append({'movie_id': movie_id, 'keyword_id': keyword['id']})
+
+            credits = details.get('credits', {})
+            for actor in credits.get('cast', []):
+                people[actor['id']] = {
+                    'tmdb_id': actor['id'],
+                    'name': actor['name'],
+                    'profile_path': actor.get('profile_path', ''),
+                    'last_updated': now
+                }
+                acted_in.append({
+                    'person_id': actor['id'],
+                    'movie_id': movie_id,
+                    'character': actor.get('character', '')
+                })
+
+            for crew in credits.get('crew', []):
+                if crew['job'] != 'Director':
+                    continue
+                people[crew['id']] = {
+                    'tmdb_id': crew['id'],
+                    'name': crew['name'],
+                    'profile_path': crew.get('profile_path', ''),
+                    'last_updated': now
+                }
+                directed.append({'person_id': crew['id'], 'movie_id': movie_id})
+
+        return {
+            'movies': movies,
+            'people': list(people.values()),
+            'genres': list(genres.values()),
+            'keywords': list(keywords.values()),
+            'acted_in': acted_in,
+            'directed': directed,
+            'in_genre': in_genre,
+            'has_keyword': has_keyword
+        }
+
+    def write_batch(self, tx, batch: Dict[str, List[Dict]], replace: bool = False):
         """
-        Create genre nodes and relationships with movies
+        Upsert a collected batch with one UNWIND statement per entity type.
+        With `replace`, the movies' existing cast, crew, genre and keyword
+        relationships are dropped first so removed credits don't linger.
+        Empty parameter lists are skipped. Returns the tmdb_ids of people
+        whose ACTED_IN credits were dropped, so their stats can be recounted.
         """
-        query = """
-        MERGE (g:Genre {tmdb_id: $genre_id})
-        SET g.name = $name
-        MERGE (m:Movie {tmdb_id: $movie_id})
-        MERGE (m)-[:IN_GENRE]->(g)
+        uncredited = []
+        if replace:
+            movie_ids = [movie['tmdb_id'] for movie in batch['movies']]
+            tx.run("""
+            UNWIND $ids AS id
+            MATCH (:Movie {tmdb_id: id})-[r:IN_GENRE|HAS_KEYWORD]->()
+            DELETE r
+            """, ids=movie_ids)
+            record = tx.run("""
+            UNWIND $ids AS id
+            MATCH (:Movie {tmdb_id: id})<-[r:ACTED_IN|DIRECTED]-(p:Person)
+            WITH r, p, type(r) = 'ACTED_IN' AS acted
+            DELETE r
+            RETURN collect(DISTINCT CASE WHEN acted THEN p.tmdb_id END) AS uncredited
+            """, ids=movie_ids).single()
+            uncredited = record['uncredited'] if record else []
+
+        if batch['movies']:
+            tx.run(f"""
+            UNWIND $rows AS row
+            MERGE (m:Movie {{tmdb_id: row.tmdb_id}})
+            SET 
+                m.title = row.title,
+                m.overview = row.overview,
+                m.release_date = CASE WHEN coalesce(row.release_date, '') = '' THEN null
+                                      ELSE date(row.release_date) END,
+                m.release_year = row.release_year,
+                m.vote_average = row.vote_average,
+                m.vote_count = row.vote_count,
+                m.popularity = row.popularity,
+                m.poster_path = row.poster_path,
+                m.normalized_rating = {NORMALIZED_RATING.format('row')},
+                m.last_updated = row.last_updated
+            """, rows=batch['movies'])
+
+        if batch['people']:
+            tx.run("""
+            UNWIND $rows AS row
+            MERGE (p:Person {tmdb_id: row.tmdb_id})
+            SET 
+                p.name = row.name,
+                p.profile_path = row.profile_path,
+                p.last_updated = row.last_updated
+            """, rows=batch['people'])
+
+        if batch['genres']:
+            tx.run("""
+            UNWIND $rows AS row
+            MERGE (g:Genre {tmdb_id: row.tmdb_id})
+            SET g.name = row.name
+            """, rows=batch['genres'])
+
+        if batch['keywords']:
+            tx.run("""
+            UNWIND $rows AS row
+            MERGE (k:Keyword {tmdb_id: row.tmdb_id})
+            SET k.name = row.name
+            """, rows=batch['keywords'])
+
+        if batch['acted_in']:
+            tx.run("""
+            UNWIND $rows AS row
+            MATCH (p:Person {tmdb_id: row.person_id})
+            MATCH (m:Movie {tmdb_id: row.movie_id})
+            MERGE (p)-[r:ACTED_IN]->(m)
+            SET r.character = row.character
+            """, rows=batch['acted_in'])
+
+        if batch['directed']:
+            tx.run("""
+            UNWIND $rows AS row
+            MATCH (p:Person {tmdb_id: row.person_id})
+            MATCH (m:Movie {tmdb_id: row.movie_id})
+            MERGE (p)-[:DIRECTED]->(m)
+            """, rows=batch['directed'])
+
+        if batch['in_genre']:
+            tx.run("""
+            UNWIND $rows AS row
+            MATCH (m:Movie {tmdb_id: row.movie_id})
+            MATCH (g:Genre {tmdb_id: row.genre_id})
+            MERGE (m)-[:IN_GENRE]->(g)
+            """, rows=batch['in_genre'])
+
+        if batch['has_keyword']:
+            tx.run("""
+            UNWIND $rows AS row
+            MATCH (m:Movie {tmdb_id: row.movie_id})
+            MATCH (k:Keyword {tmdb_id: row.keyword_id})
+            MERGE (m)-[:HAS_KEYWORD]->(k)
+            """, rows=batch['has_keyword'])
+        return uncredited
+
+    def write_collected(self, session, batch: Dict[str, List[Dict]], replace: bool = False):
+        """
+        Write a batch built by collect_batch in a single transaction.
+        People, genres and keywords already written in this run are left out,
+        so only their relationships to the batch's movies are written.
+        """
+        with self.written_lock:
+            batch = dict(batch)
+            for key, written in self.written_nodes.items():
+                batch[key] = [row for row in batch[key] if row['tmdb_id'] not in written]
+
+        with self.metrics.timer('neo4j_transaction_seconds', operation='write_batch'):
+            uncredited = session.execute_write(self.write_batch, batch, replace) or []
+        for key, rows in batch.items():
+            self.metrics.inc('neo4j_rows_written_total', len(rows), entity=key)
+        self.metrics.inc('movies_written_total', len(batch['movies']))
+
+        # Only mark nodes once committed, so a concurrent writer never skips a
+        # node that another writer's transaction could still roll back
+        with self.written_lock:
+            for key, written in self.written_nodes.items():
+                written.update(row['tmdb_id'] for row in batch[key])
+            self.committed_batches += 1
+        logger.info(
+            f"Wrote batch of {len(batch['movies'])} movies, {len(batch['people'])} people, "
+            f"{len(batch['genres'])} genres, {len(batch['keywords'])} keywords"
+        )
+        if self.maintain_similarities and batch['movies']:
+            self.refresh_similarities(session, [movie['tmdb_id'] for movie in batch['movies']])
+        if self.maintain_analytics and batch['movies']:
+            self.refresh_analytics(session, [movie['tmdb_id'] for movie in batch['movies']], uncredited)
+
+    def refresh_similarities(self, session, movie_ids: List[int]):
+        """
+        Recompute the SIMILAR_TO neighbourhood of freshly written movies.
+        Runs in its own transaction; a failure leaves the movies written and
+        is fixed by the next refresh or by --rebuild-similar.
         """
-        tx.run(query, {
-            'genre_id': genre['id'],
-            'name': genre['name'],
-            'movie_id': movie_id
-        })
+        try:
+            with self.metrics.timer('neo4j_transaction_seconds', operation='update_similarities'):
+                session.execute_write(update_similarities, movie_ids, self.similar_top_k)
+        except Exception as e:
+            logger.error(f"Error updating similarities for {len(movie_ids)} movies: {str(e)}")
 
-    def create_keyword_node(self, tx, keyword, movie_id):
+    def refresh_analytics(self, session, movie_ids: List[int], uncredited: Optional[List[int]] = None):
+        """
+        Update the dashboard aggregates touched by freshly written movies and
+        by the people whose credits a replace dropped (`uncredited`), in
+        their own transaction like refresh_similarities
         """
-        Create keyword nodes and relationships with movies
+        try:
+            with self.metrics.timer('neo4j_transaction_seconds', operation='update_analytics'):
+                session.execute_write(update_analytics, movie_ids, uncredited=uncredited)
+        except Exception as e:
+            logger.error(f"Error updating analytics for {len(movie_ids)} movies: {str(e)}")
+
+    def begin_run(self, preload_genres: bool = True):
         """
-        query = """
-        MERGE (k:Keyword {tmdb_id: $keyword_id})
-        SET k.name = $name
-        MERGE (m:Movie {tmdb_id: $movie_id})
-        MERGE (m)-[:HAS_KEYWORD]->(k)
+        Prepare for an ingestion run: ensure the schema, forget the previous
+        run's written nodes and, unless offline, bulk-load TMDB's genre list
         """
-        tx.run(query, {
-            'keyword_id': keyword['id'],
-            'name': keyword['name'],
-            'movie_id': movie_id
-        })
+        self.setup_schema()
+        with self.written_lock:
+            for written in self.written_nodes.values():
+                written.clear()
+            self.committed_batches = 0
+        if preload_genres:
+            self.preload_genres()
 
-    def update_database(self):
+    def preload_genres(self):
         """
-        Main function to update the Neo4j database with movie data
+        Upsert TMDB's whole (small, fixed) movie genre list in one transaction
         """
         try:
-            movies = self.fetch_popular_movies(num_pages=10)
+            genres = [
+                {'tmdb_id': genre['id'], 'name': genre['name']}
+                for genre in self.client.get('/genre/movie/list', {'language': 'en-US'})['genres']
+            ]
+        except Exception as e:
+            logger.error(f"Error fetching genre list: {str(e)}")
+            return
+
+        with self.driver.session() as session:
+            session.execute_write(lambda tx: tx.run("""
+            UNWIND $rows AS row
+            MERGE (g:Genre {tmdb_id: row.tmdb_id})
+            SET g.name = row.name
+            """, rows=genres).consume())
+        with self.written_lock:
+            self.written_nodes['genres'].update(genre['tmdb_id'] for genre in genres)
+        logger.info(f"Preloaded {len(genres)} genres")
+
+    def setup_schema(self) -> bool:
+        """
+        Create constraints and indexes and check they are online before ingesting
+        """
+        with self.driver.session() as session:
+            ready = ensure_schema(session)
+            run_migrations(session)
+            return ready
+
+    def update_database(self, num_pages: int = 10, resume: bool = False):
+        """
+        Main function to update the Neo4j database with movie data.
+        Listing, detail fetching and Neo4j writes run as overlapping pipeline stages.
+        Progress is checkpointed; with `resume` the last checkpoint's failed
+        movies are retried and only its unfinished pages are crawled.
+        """
+        try:
+            self.begin_run()
+            started = date.today()
+            checkpoint = IngestCheckpoint.load() if resume else None
+            if checkpoint is None:
+                if resume:
+                    logger.info("No checkpoint found, starting from page 1")
+                checkpoint = IngestCheckpoint(num_pages=num_pages)
+                checkpoint.save()
+            else:
+                # The run's data is only as current as when it first started
+                started = date.fromisoformat(checkpoint.started[:10])
+                logger.info(
+                    f"Resuming run from {checkpoint.started}: {len(checkpoint.completed_pages)} pages "
+                    f"and {len(checkpoint.committed)} movies done, {len(checkpoint.failed)} to retry"
+                )
+                retry_ids = checkpoint.take_failed()
+                if retry_ids:
+                    self.run_pipeline(self.build_pipeline(checkpoint=checkpoint), retry_ids)
+
+            pipeline = self.build_pipeline(list_pages=True, checkpoint=checkpoint)
+            self.run_pipeline(pipeline, checkpoint.pending_pages())
+
+            if checkpoint.failed or checkpoint.pending_pages():
+                logger.warning(
+                    f"{len(checkpoint.failed)} movies and {len(checkpoint.pending_pages())} pages "
+                    f"failed, run with --resume to retry them"
+                )
+                with self.driver.session() as session:
+                    self.bump_data_version_if_written(session)
+                return
+            checkpoint.remove()
             with self.driver.session() as session:
-                for movie in movies:
-                    details = self.fetch_movie_details(movie['id'])
-                    if not details:
-                        continue
-
-                    session.execute_write(self.create_movie_node, details)
-
-                    # Process genres
-                    if 'genres' in details:
-                        for genre in details['genres']:
-                            session.execute_write(self.create_genre_node, genre, details['id'])
-
-                    # Process keywords
-                    if 'keywords' in details and 'keywords' in details['keywords']:
-                        for keyword in details['keywords']['keywords']:
-                            session.execute_write(self.create_keyword_node, keyword, details['id'])
-
-                    # Process cast
-                    if 'credits' in details and 'cast' in details['credits']:
-                        for actor in details['credits']['cast']:
-                            actor['movie_id'] = details['id']  # Add movie_id to actor data
-                            session.execute_write(self.create_person_node, actor, 'ACTED_IN')
-
-                    # Process directors
-                    if 'credits' in details and 'crew' in details['credits']:
-                        directors = [crew for crew in details['credits']['crew'] if crew['job'] == 'Director']
-                        for director in directors:
-                            director['movie_id'] = details['id']  # Add movie_id to director data
-                            session.execute_write(self.create_person_node, director, 'DIRECTED')
-
-                    logger.info(f"Processed movie: {details['title']}")
-                    time.sleep(0.25) 
+                self.set_initial_watermark(session, started)
 
         except Exception as e:
             logger.error(f"Error updating database: {str(e)}")
 
+    def build_pipeline(self, list_pages: bool = False, replace: bool = False,
+                       checkpoint: Optional[IngestCheckpoint] = None,
+                       fetch_details: bool = True) -> Pipeline:
+        """
+        Build the ingestion pipeline:
+        list (page -> movie ids) -> fetch (id -> details) ->
+        transform (details batch -> graph records) -> write (records -> Neo4j).
+        Without `list_pages` the pipeline is fed movie ids directly, and
+        without `fetch_details` it is fed movie details that are already loaded.
+        Cached movie details are always revalidated with TMDB, and with
+        `replace` the movies' old relationships are replaced. A `checkpoint` records listed pages,
+        committed movies and failures, and committed movies are skipped.
+        """
+        def list_page(page):
+            movie_ids = [movie['id'] for movie in self.fetch_popular_page(page)]
+            if checkpoint is None:
+                return movie_ids
+            if not movie_ids:
+                # Listing failed; leave the page unfinished so a resume lists it again
+                return []
+            checkpoint.page_listed(page, movie_ids)
+            return [movie_id for movie_id in movie_ids if not checkpoint.is_committed(movie_id)]
+
+        def fetch(movie_id):
+            # Always revalidate: an unchanged movie costs a 304, a changed one
+            # is never served from a cache entry up to a week old
+            details = self.fetch_movie_details(movie_id, refresh=True)
+            if details:
+                logger.info(f"Processed movie: {details['title']}")
+                return [details]
+            if checkpoint is not None:
+                checkpoint.mark_failed([movie_id])
+            return []
+
+        def transform(details_list):
+            return [self.collect_batch(details_list)]
+
+        def write(batch):
+            movie_ids = [movie['tmdb_id'] for movie in batch['movies']]
+            try:
+                with self.driver.session() as session:
+                    self.write_collected(session, batch, replace)
+            except Exception:
+                if checkpoint is not None:
+                    checkpoint.mark_failed(movie_ids)
+                raise
+            if checkpoint is not None:
+                checkpoint.mark_committed(movie_ids)
+
+        workers = self.stage_workers
+        pipeline = Pipeline()
+        if list_pages:
+            pipeline.add_stage('list', list_page, workers['list'], self.queue_size)
+        if fetch_details:
+            pipeline.add_stage('fetch', fetch, workers['fetch'], self.queue_size)
+        pipeline.add_stage('transform', transform, workers['transform'], self.queue_size,
+                           batch_size=self.batch_size)
+        # Each queued item here is already a whole batch, so keep the queue short
+        pipeline.add_stage('write', write, workers['write'], max(1, workers['write'] * 2))
+        return pipeline
+
+    def ingest_id_export(self, path: str, min_popularity: float = 0.0, include_adult: bool = False):
+        """
+        Load every movie listed in a TMDB daily ID export file. IDs are
+        streamed from the file straight into the fetch stage, so memory use
+        doesn't grow with the size of the catalog. Failed movies are kept in
+        the checkpoint for --resume; committed ones aren't tracked.
+        """
+        try:
+            self.begin_run()
+            started = date.today()
+            checkpoint = IngestCheckpoint(track_committed=False)
+            checkpoint.save()
+            self.write_movies(read_id_export(path, min_popularity, include_adult), checkpoint=checkpoint)
+
+            with self.driver.session() as session:
+                if checkpoint.failed:
+                    logger.warning(
+                        f"{len(checkpoint.failed)} movies failed, run with --resume to retry them "
+                        f"(first: {sorted(checkpoint.failed)[:100]})"
+                    )
+                    self.bump_data_version_if_written(session)
+                    return
+                checkpoint.remove()
+                self.set_initial_watermark(session, started)
+        except Exception as e:
+            logger.error(f"Error ingesting ID export: {str(e)}")
+
+    def write_movies(self, movie_ids: Iterable[int], replace: bool = False,
+                     checkpoint: Optional[IngestCheckpoint] = None):
+        """
+        Fetch details for `movie_ids` and write them every `batch_size` movies.
+        A `checkpoint` records which were committed and which failed.
+        """
+        self.run_pipeline(self.build_pipeline(replace=replace, checkpoint=checkpoint), movie_ids)
+
+    def run_sharded(self, run: str, num_pages: int = 10, movie_ids: Optional[Iterable[int]] = None,
+                    worker: Optional[str] = None, lease_seconds: int = DEFAULT_LEASE_SECONDS):
+        """
+        Take part in the sharded run `run` as one of possibly many workers,
+        each in its own process and possibly on its own host. The run's
+        shards (groups of listing pages, or of `movie_ids` when given) live in
+        a lease-based work queue in Neo4j; every worker enqueues the same
+        shards, then claims and ingests them until none are left.
+        """
+        worker = worker or f'{socket.gethostname()}-{os.getpid()}'
+        queue = WorkQueue(self.driver, run, lease_seconds)
+        try:
+            self.begin_run()
+            if movie_ids is not None:
+                queue.enqueue('ids', chunked(movie_ids, DEFAULT_IDS_PER_SHARD))
+            else:
+                queue.enqueue('pages', chunked(range(1, num_pages + 1), DEFAULT_PAGES_PER_SHARD))
+
+            while True:
+                shard = queue.claim(worker)
+                if shard is None:
+                    if queue.remaining() == 0:
+                        break
+                    # Other workers hold the rest; wait for them to finish or their leases to expire
+                    time.sleep(WORKER_POLL_SECONDS)
+                    continue
+                self.process_shard(queue, shard, worker)
+
+            summary = queue.summary()
+            logger.info(f"Run {run} finished: {summary['shards']}")
+            if summary['failed_shards']:
+                logger.warning(f"Shards {summary['failed_shards']} of run {run} failed after every attempt")
+                with self.driver.session() as session:
+                    self.bump_data_version_if_written(session)
+                return
+            with self.driver.session() as session:
+                self.set_initial_watermark(session, date.fromisoformat(summary['created']))
+
+        except Exception as e:
+            logger.error(f"Error in sharded run {run}: {str(e)}")
+
+    def process_shard(self, queue: WorkQueue, shard: Dict, worker: str):
+        """
+        Ingest one claimed shard through the normal pipeline, renewing its
+        lease meanwhile, then report it done or hand it back for a retry
+        """
+        number = shard['shard']
+        logger.info(f"Worker {worker} took shard {number} ({shard['kind']}), attempt {shard['attempts']}")
+        # Tracks this shard's listed pages and failed movies only
+        checkpoint = IngestCheckpoint(
+            os.path.join(tempfile.gettempdir(), f'ingest-{queue.run}-{worker}-{number}.json'))
+        try:
+            with queue.lease(number, worker) as lost:
+                if shard['kind'] == 'pages':
+                    self.run_pipeline(self.build_pipeline(list_pages=True, checkpoint=checkpoint), shard['items'])
+                    unlisted = [page for page in shard['items'] if page not in checkpoint.completed_pages]
+                    if unlisted:
+                        logger.warning(f"Shard {number} could not list pages {unlisted}")
+                else:
+                    self.run_pipeline(self.build_pipeline(checkpoint=checkpoint), shard['items'])
+                    unlisted = []
+            if lost.is_set():
+                # Someone else may be redoing it; writes are idempotent so nothing to undo
+                return
+            if unlisted or checkpoint.failed:
+                logger.warning(f"Shard {number} had {len(checkpoint.failed)} failed movies, returning it to the queue")
+                queue.fail(number, worker, sorted(checkpoint.failed))
+            else:
+                queue.complete(number, worker)
+        except Exception:
+            queue.fail(number, worker, [])
+            raise
+        finally:
+            checkpoint.remove()
+
+    def run_pipeline(self, pipeline: Pipeline, source: Iterable):
+        """
+        Run `pipeline` over `source`, sampling its queue depths into the metrics
+        """
+        with self.metrics.sampling(pipeline.queue_depths):
+            pipeline.run(source)
+        for stage, stats in pipeline.stats().items():
+            self.metrics.inc('pipeline_items_processed_total', stats['processed'], stage=stage)
+            self.metrics.inc('pipeline_items_failed_total', stats['failed'], stage=stage)
+        logger.info(f"Pipeline stats: {pipeline.stats()}")
+
+    def replay_snapshot(self, path: str):
+        """
+        Rebuild the graph from a snapshot written with `snapshot_path`,
+        without any TMDB requests. Movie details go through the batched
+        writer in the order they were archived, so later payloads win.
+        """
+        try:
+            self.begin_run(preload_genres=False)
+            start = time.monotonic()
+            people = []
+            counts = {'movies': 0}
+
+            def movie_details():
+                for record in read_snapshot(path):
+                    if MOVIE_DETAILS_PATH.match(record['path']):
+                        counts['movies'] += 1
+                        yield record['data']
+                    elif PERSON_DETAILS_PATH.match(record['path']):
+                        person = record['data']
+                        people.append({
+                            'tmdb_id': person['id'],
+                            'name': person['name'],
+                            'profile_path': person.get('profile_path', ''),
+                            'last_updated': record['fetched_at']
+                        })
+
+            self.run_pipeline(self.build_pipeline(fetch_details=False), movie_details())
+
+            # Person payloads only come from incremental syncs, apply them last
+            with self.driver.session() as session:
+                for i in range(0, len(people), self.batch_size):
+                    with self.metrics.timer('neo4j_transaction_seconds', operation='write_people'):
+                        session.execute_write(self.write_people, people[i:i + self.batch_size])
+                self.bump_data_version(session)
+
+            elapsed = time.monotonic() - start
+            logger.info(
+                f"Replayed {counts['movies']} movies and {len(people)} person updates from {path} "
+                f"in {elapsed:.1f}s ({counts['movies'] / max(elapsed, 1e-9):.0f} movies/s)"
+            )
+        except Exception as e:
+            logger.error(f"Error replaying snapshot: {str(e)}")
+
+    def latest_snapshot_movies(self, path: str) -> Iterator[Dict]:
+        """
+        Yield the last archived details payload of every movie in a snapshot.
+        Reads the snapshot twice so only movie ids are held in memory.
+        """
+        last_seen = {}
+        for index, record in enumerate(read_snapshot(path)):
+            if MOVIE_DETAILS_PATH.match(record['path']):
+                last_seen[record['data']['id']] = index
+        for index, record in enumerate(read_snapshot(path)):
+            if MOVIE_DETAILS_PATH.match(record['path']) and last_seen.get(record['data']['id']) == index:
+                yield record['data']
+
+    def export_csv(self, out_dir: str, snapshot_path: Optional[str] = None, num_pages: int = 10,
+                   movie_ids: Optional[Iterable[int]] = None):
+        """
+        Write neo4j-admin import CSVs instead of writing to Neo4j, for cold
+        loads of large catalogs. Movies come from a snapshot when
+        `snapshot_path` is given, are fetched for `movie_ids` when given,
+        and otherwise come from TMDB's popular listing.
+        """
+        try:
+            if snapshot_path:
+                source = self.latest_snapshot_movies(snapshot_path)
+            elif movie_ids is not None:
+                source = self.fetch_many_movie_details(movie_ids, refresh=True)
+            else:
+                movie_ids = [movie['id'] for movie in self.fetch_popular_movies(num_pages=num_pages)]
+                source = self.fetch_many_movie_details(movie_ids, refresh=True)
+
+            exporter = CsvExporter(out_dir)
+            try:
+                for details in source:
+                    if details:
+                        exporter.write_batch(self.collect_batch([details]))
+            finally:
+                exporter.close()
+            logger.info(f"Load the export with: {exporter.import_command()}")
+            logger.info("Then run with --rebuild-similar and --rebuild-analytics to compute SIMILAR_TO "
+                        "relationships and the dashboard aggregates")
+        except Exception as e:
+            logger.error(f"Error exporting CSVs: {str(e)}")
+
+    def get_sync_watermark(self, session) -> Optional[date]:
+        """
+        Return the date of the last successful sync, or None if there hasn't been one
+        """
+        record = session.run(
+            "MATCH (s:SyncState {name: 'tmdb'}) RETURN s.last_synced AS last_synced"
+        ).single()
+        if not record or not record['last_synced']:
+            return None
+        return date.fromisoformat(record['last_synced'])
+
+    def set_sync_watermark(self, session, synced: date):
+        """
+        Record `synced` as the date of the last successful sync and bump the
+        data version
+        """
+        session.run(
+            "MERGE (s:SyncState {name: 'tmdb'}) SET s.last_synced = $last_synced, s.data_version = randomUUID()",
+            last_synced=synced.isoformat()
+        )
+
+    def set_initial_watermark(self, session, synced: date):
+        """
+        Record `synced` as the sync watermark only if there is none yet, i.e.
+        after the first load, and bump the data version. Later full loads
+        recrawl only some movies and don't drop removed credits, so they
+        don't make the whole graph current; only sync_changes moves an
+        existing watermark.
+        """
+        record = session.run("""
+        MERGE (s:SyncState {name: 'tmdb'})
+        WITH s, s.last_synced AS previous
+        SET s.last_synced = coalesce(previous, $last_synced), s.data_version = randomUUID()
+        RETURN previous
+        """, last_synced=synced.isoformat()).single()
+        if record and record['previous']:
+            logger.info(f"Sync watermark left at {record['previous']}, run --incremental to move it")
+        else:
+            logger.info(f"Sync watermark set to {synced.isoformat()}")
+
+    def bump_data_version(self, session):
+        """
+        Tell readers such as app.py's query cache that the graph changed.
+        A random token rather than a counter, so clearing the database
+        (and with it this node) can never bring back an old version.
+        """
+        session.run("MERGE (s:SyncState {name: 'tmdb'}) SET s.data_version = randomUUID()")
+
+    def bump_data_version_if_written(self, session):
+        """
+        Bump the data version if this run committed any batch. For runs that
+        end with failures: the watermark stays put, but readers should still
+        see the movies that were written.
+        """
+        if self.committed_batches:
+            self.bump_data_version(session)
+
+    def fetch_changed_ids(self, kind: str, start: date, end: date) -> Set[int]:
+        """
+        Collect the IDs TMDB reports as changed between `start` and `end`.
+        `kind` is 'movie' or 'person'.
+        """
+        changed = set()
+        window_start = start
+        while window_start <= end:
+            window_end = min(end, window_start + timedelta(days=CHANGES_WINDOW_DAYS - 1))
+            params = {'start_date': window_start.isoformat(), 'end_date': window_end.isoformat()}
+
+            first = self.client.get(f'/{kind}/changes', dict(params, page=1))
+            pages = [first]
+            if first.get('total_pages', 1) > 1:
+                pages.extend(self.client.map(
+                    lambda page: self.client.get(f'/{kind}/changes', dict(params, page=page)),
+                    range(2, first['total_pages'] + 1)
+                ))
+            for data in pages:
+                changed.update(item['id'] for item in data['results'])
+
+            window_start = window_end + timedelta(days=1)
+        return changed
+
+    def existing_ids(self, session, label: str, ids: Set[int]) -> List[int]:
+        """
+        Return which of `ids` already exist as `label` nodes in the graph
+        """
+        result = session.run(
+            f"UNWIND $ids AS id MATCH (n:{label} {{tmdb_id: id}}) RETURN n.tmdb_id AS id",
+            ids=list(ids)
+        )
+        return [record['id'] for record in result]
+
+    def fetch_person_details(self, person_id):
+        '''
+        Fetch detailed information for a specific person. Only called for
+        people TMDB reports as changed, so the cached copy is always revalidated.
+        '''
+        try:
+            return self.client.get(f'/person/{person_id}', refresh=True)
+        except Exception as e:
+            logger.error(f"Error fetching details for person {person_id}: {str(e)}")
+            return None
+
+    def write_people(self, tx, people: List[Dict]):
+        """
+        Update name and profile image of existing person nodes
+        """
+        tx.run("""
+        UNWIND $rows AS row
+        MATCH (p:Person {tmdb_id: row.tmdb_id})
+        SET 
+            p.name = row.name,
+            p.profile_path = row.profile_path,
+            p.last_updated = row.last_updated
+        """, rows=people)
+
+    def sync_changes(self):
+        """
+        Incrementally update the graph from TMDB's change feeds.
+        Only movies and people already in the graph that changed since the
+        last successful sync are refetched and rewritten. Falls back to a
+        full update when no sync has been recorded yet.
+        """
+        try:
+            with self.driver.session() as session:
+                watermark = self.get_sync_watermark(session)
+                if watermark is None:
+                    logger.info("No previous sync recorded, running a full update")
+                    self.update_database()
+                    return
+
+                self.begin_run()
+                started = date.today()
+                changed_movies = self.existing_ids(
+                    session, 'Movie', self.fetch_changed_ids('movie', watermark, started))
+                changed_people = self.existing_ids(
+                    session, 'Person', self.fetch_changed_ids('person', watermark, started))
+                logger.info(
+                    f"{len(changed_movies)} movies and {len(changed_people)} people "
+                    f"changed since {watermark.isoformat()}"
+                )
+
+                # Tracks this sync's committed and failed movies only
+                checkpoint = IngestCheckpoint(
+                    os.path.join(tempfile.gettempdir(), f'sync-{os.getpid()}.json'))
+                try:
+                    self.write_movies(changed_movies, replace=True, checkpoint=checkpoint)
+                finally:
+                    checkpoint.remove()
+                failed_movies = sorted(set(changed_movies) - checkpoint.committed)
+
+                now = datetime.now().isoformat()
+                people = []
+                failed_people = []
+                for person_id, person in zip(changed_people,
+                                             self.client.map(self.fetch_person_details, changed_people)):
+                    if person:
+                        people.append({
+                            'tmdb_id': person['id'],
+                            'name': person['name'],
+                            'profile_path': person.get('profile_path', ''),
+                            'last_updated': now
+                        })
+                    else:
+                        failed_people.append(person_id)
+                for i in range(0, len(people), self.batch_size):
+                    chunk = people[i:i + self.batch_size]
+                    try:
+                        with self.metrics.timer('neo4j_transaction_seconds', operation='write_people'):
+                            session.execute_write(self.write_people, chunk)
+                        with self.written_lock:
+                            self.committed_batches += 1
+                    except Exception as e:
+                        logger.error(f"Error writing {len(chunk)} people: {str(e)}")
+                        failed_people.extend(person['tmdb_id'] for person in chunk)
+
+                if failed_movies or failed_people:
+                    # Keep the old watermark so the next sync sees these changes again
+                    logger.warning(
+                        f"Sync incomplete, watermark left at {watermark.isoformat()}. "
+                        f"Movies to retry: {failed_movies}. People to retry: {sorted(failed_people)}"
+                    )
+                    self.bump_data_version_if_written(session)
+                    return
+                self.set_sync_watermark(session, started)
+                logger.info(f"Sync complete, watermark moved to {started.isoformat()}")
+
+        except Exception as e:
+            logger.error(f"Error syncing changes: {str(e)}")
+
 def main():
-    movie_db = MovieDatabase()
+    parser = argparse.ArgumentParser(description="Load TMDB movies into Neo4j")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only refetch movies and people changed since the last sync")
+    parser.add_argument('--resume', action='store_true',
+                        help="continue the last interrupted run from its checkpoint")
+    parser.add_argument('--snapshot', metavar='PATH',
+                        help="archive every raw TMDB payload to a gzipped JSON-lines snapshot "
+                             "(later runs add PATH.1, PATH.2, ...)")
+    parser.add_argument('--replay', metavar='PATH',
+                        help="rebuild the graph from a snapshot without calling TMDB")
+    clear_choice = parser.add_mutually_exclusive_group()
+    clear_choice.add_argument('--clear', action='store_true',
+                              help="clear the database before updating, without asking for confirmation")
+    clear_choice.add_argument('--no-clear', action='store_true',
+                              help="keep the existing database and update it, without asking")
+    parser.add_argument('--clear-only', action='store_true',
+                        help="clear the database without asking for confirmation, then exit")
+    parser.add_argument('--id-export', metavar='PATH',
+                        help="load every movie in a TMDB daily ID export file (movie_ids_*.json.gz)")
+    parser.add_argument('--min-popularity', type=float, default=0.0,
+                        help="skip --id-export movies below this popularity")
+    parser.add_argument('--include-adult', action='store_true',
+                        help="keep --id-export movies flagged as adult")
+    parser.add_argument('--metrics-report', metavar='PATH',
+                        help="write a JSON metrics report to PATH at the end of the run")
+    parser.add_argument('--metrics-port', type=int,
+                        help="serve Prometheus metrics on this port while running")
+    parser.add_argument('--metrics-file', metavar='PATH',
+                        help="keep Prometheus text metrics in PATH up to date while running")
+    parser.add_argument('--rebuild-similar', action='store_true',
+                        help="recompute normalized_rating and every SIMILAR_TO relationship, then exit")
+    parser.add_argument('--rebuild-analytics', action='store_true',
+                        help="recompute the Analytics Dashboard's stats and leaderboards, then exit")
+    parser.add_argument('--pages', type=int, default=10,
+                        help="listing pages of popular movies to crawl (20 movies each)")
+    parser.add_argument('--worker', metavar='RUN',
+                        help="join the sharded run RUN as one worker; start the same command on every "
+                             "host or process that should share the work")
+    parser.add_argument('--lease-seconds', type=int, default=DEFAULT_LEASE_SECONDS,
+                        help="how long a --worker holds a shard without renewing before others may take it")
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE,
+                        help="TMDB requests per second for this process; split TMDB's budget across workers")
+    parser.add_argument('--export-csv', metavar='DIR',
+                        help="write neo4j-admin import CSVs to DIR instead of writing to Neo4j "
+                             "(reads the --replay snapshot or --id-export file when given)")
+    args = parser.parse_args()
+
+    metrics = IngestMetrics(args.metrics_report, args.metrics_file, args.metrics_port)
+    metrics.start()
+    # Refreshing neighbourhoods batch by batch costs more the bigger the
+    # graph gets, so whole-catalog ID-export loads rebuild them once afterwards
+    movie_db = MovieDatabase(snapshot_path=args.snapshot, metrics=metrics, rate=args.rate,
+                             maintain_similarities=not args.id_export)
     try:
-        # Ask for confirmation before clearing and updating
-        should_clear = input("Do you want to clear the existing database before updating? (yes/no): ")
-        if should_clear.lower() == 'yes':
-            movie_db.clear_database()
-        movie_db.update_database()
+        if args.clear or args.clear_only:
+            movie_db.clear_database(confirm=False)
+            if args.clear_only:
+                return
+        if args.rebuild_similar:
+            rebuild_similarities(movie_db.driver, movie_db.batch_size, movie_db.similar_top_k)
+            with movie_db.driver.session() as session:
+                movie_db.bump_data_version(session)
+            return
+        if args.rebuild_analytics:
+            rebuild_analytics(movie_db.driver)
+            with movie_db.driver.session() as session:
+                movie_db.bump_data_version(session)
+            return
+        if args.export_csv:
+            movie_ids = None
+            if args.id_export:
+                movie_ids = read_id_export(args.id_export, args.min_popularity, args.include_adult)
+            movie_db.export_csv(args.export_csv, snapshot_path=args.replay, num_pages=args.pages,
+                                movie_ids=movie_ids)
+            return
+        if args.worker:
+            movie_ids = None
+            if args.id_export:
+                movie_ids = read_id_export(args.id_export, args.min_popularity, args.include_adult)
+            movie_db.run_sharded(args.worker, num_pages=args.pages, movie_ids=movie_ids,
+                                 lease_seconds=args.lease_seconds)
+            if args.id_export:
+                logger.info("Similar movies weren't maintained; run --rebuild-similar once every worker is done")
+            return
+        if args.id_export:
+            movie_db.ingest_id_export(args.id_export, args.min_popularity, args.include_adult)
+            logger.info("Similar movies weren't maintained; run --rebuild-similar to compute them")
+            return
+        if args.replay:
+            movie_db.replay_snapshot(args.replay)
+            return
+        if args.incremental:
+            movie_db.sync_changes()
+            return
+        if args.resume:
+            movie_db.update_database(num_pages=args.pages, resume=True)
+            return
+
+        # Ask for confirmation before clearing and updating; scripted runs
+        # (no terminal attached) keep the database unless --clear is given
+        if not args.clear and not args.no_clear and sys.stdin.isatty():
+            should_clear = input("Do you want to clear the existing database before updating? (yes/no): ")
+            if should_clear.lower() == 'yes':
+                movie_db.clear_database()
+        movie_db.update_database(num_pages=args.pages)
     finally:
         movie_db.close()
 
@@ -0,0 +1,169 @@
+import json
+import os
+import pickle
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = int(os.getenv('QUERY_CACHE_MB', '256')) * 1024 * 1024
+DEFAULT_TTL = int(os.getenv('QUERY_CACHE_TTL', '3600'))
+
+# How often the data version is read from Neo4j; between checks, cached
+# results are served without touching the database at all
+DEFAULT_VERSION_INTERVAL = 5.0
+
+DATA_VERSION_QUERY = "MATCH (s:SyncState {name: 'tmdb'}) RETURN s.data_version AS version"
+
+
+def _size(value: Any) -> int:
+    try:
+        return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return len(repr(value))
+
+
+class QueryCache:
+    """
+    Process-wide, thread-safe cache of query results keyed by query text and
+    parameters, shared by every Streamlit session. Entries are evicted least
+    recently used first once `max_bytes` is exceeded, expire after `ttl`
+    seconds, and are all dropped when the loader's data version changes
+    (see check_version).
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES, ttl: int = DEFAULT_TTL,
+                 version_interval: float = DEFAULT_VERSION_INTERVAL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.version_interval = version_interval
+        self.entries: 'OrderedDict[Tuple[str, str], Tuple[Any, int, float]]' = OrderedDict()
+        self.bytes = 0
+        self.data_version = None
+        self.version_checked = 0.0
+        self.counts = {'hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0, 'invalidations': 0}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_key(query: str, params: Optional[Dict]) -> Tuple[str, str]:
+        return query, json.dumps(params or {}, sort_keys=True, default=str)
+
+    def check_version(self, fetch_version: Callable[[], Any]):
+        """
+        Drop every entry if the data version returned by `fetch_version`
+        changed. Only calls it once per `version_interval` seconds.
+        """
+        now = time.monotonic()
+        with self.lock:
+            if now - self.version_checked < self.version_interval:
+                return
+            self.version_checked = now
+        try:
+            version = fetch_version()
+        except Exception as e:
+            logger.error(f"Error reading data version: {str(e)}")
+            return
+        with self.lock:
+            if version != self.data_version:
+                if self.entries:
+                    logger.info(f"Data version changed to {version}, dropping {len(self.entries)} cached results")
+                    self.counts['invalidations'] += 1
+                self.entries.clear()
+                self.bytes = 0
+                self.data_version = version
+
+    def get(self, query: str, params: Optional[Dict] = None) -> Tuple[bool, Any]:
+        """
+        Return (True, result) for a fresh cached result, else (False, None)
+        """
+        key = self.make_key(query, params)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.counts['misses'] += 1
+                return False, None
+            value, size, expires = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                self.bytes -= size
+                self.counts['expired'] += 1
+                self.counts['misses'] += 1
+                return False, None
+            self.entries.move_to_end(key)
+            self.counts['hits'] += 1
+            return True, value
+
+    def put(self, query: str, params: Optional[Dict], value: Any):
+        size = _size(value)
+        if size > self.max_bytes:
+            return
+        key = self.make_key(query, params)
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self.entries[key] = (value, size, time.monotonic() + self.ttl)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self.entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.counts['evictions'] += 1
+
+    def cached(self, query: str, params: Optional[Dict], run: Callable[[], Any]) -> Any:
+        """
+        Return the cached result for (query, params), calling `run` on a miss.
+        Results are shared between callers and must not be modified.
+        """
+        hit, value = self.get(query, params)
+        if hit:
+            return value
+        version = self.data_version
+        value = run()
+        # Don't keep a result read while the data version was changing under it
+        if self.data_version == version:
+            self.put(query, params, value)
+        return value
+
+    def cached_batch(self, query: str, name: str, values: Iterable,
+                     run: Callable[[List], Dict[Any, Any]], default: Any = None) -> Dict[Any, Any]:
+        """
+        Per-value results of a batched query, each cached as if `query` had
+        been run with {name: value}. `run` is called once with every value
+        that missed and returns their results by value; values it leaves out
+        get `default`.
+        """
+        results = {}
+        missing = []
+        for value in values:
+            hit, result = self.get(query, {name: value})
+            if hit:
+                results[value] = result
+            else:
+                missing.append(value)
+        if missing:
+            version = self.data_version
+            found = run(missing)
+            for value in missing:
+                results[value] = found.get(value, default)
+                if self.data_version == version:
+                    self.put(query, {name: value}, results[value])
+        return results
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict:
+        with self.lock:
+            lookups = self.counts['hits'] + self.counts['misses']
+            return dict(
+                self.counts,
+                entries=len(self.entries),
+                bytes=self.bytes,
+                hit_rate=round(self.counts['hits'] / lookups, 3) if lookups else 0.0,
+                data_version=self.data_version,
+            )
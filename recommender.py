@@ -0,0 +1,186 @@
+import time
+import logging
+from typing import Dict, List, Tuple
+
+import numpy as np
+from scipy import sparse
+
+from similarity import (ACTOR_WEIGHT, DIRECTOR_WEIGHT, GENRE_WEIGHT, KEYWORD_WEIGHT,
+                        RATING_WEIGHT, POPULARITY_WEIGHT)
+
+logger = logging.getLogger(__name__)
+
+MOVIES_QUERY = """
+MATCH (m:Movie)
+RETURN m.tmdb_id AS id, m.title AS title, m.vote_average AS rating, m.vote_count AS vote_count,
+       m.popularity AS popularity, m.overview AS overview, m.poster_path AS poster,
+       m.release_date AS release_date
+"""
+
+# Movie-feature incidence, one query per feature. People are keyed by
+# elementId so the page's filmography popup can look them up.
+INCIDENCE_QUERIES = {
+    'actors': """
+    MATCH (p:Person)-[:ACTED_IN]->(m:Movie)
+    RETURN m.tmdb_id AS movie, elementId(p) AS key, p.name AS name, p.profile_path AS profile_path
+    """,
+    'directors': """
+    MATCH (p:Person)-[:DIRECTED]->(m:Movie)
+    RETURN m.tmdb_id AS movie, elementId(p) AS key, p.name AS name, p.profile_path AS profile_path
+    """,
+    'genres': """
+    MATCH (m:Movie)-[:IN_GENRE]->(g:Genre)
+    RETURN m.tmdb_id AS movie, g.tmdb_id AS key, g.name AS name
+    """,
+    'keywords': """
+    MATCH (m:Movie)-[:HAS_KEYWORD]->(k:Keyword)
+    RETURN m.tmdb_id AS movie, k.tmdb_id AS key, k.name AS name
+    """,
+}
+
+FEATURE_WEIGHTS = {
+    'actors': ACTOR_WEIGHT,
+    'directors': DIRECTOR_WEIGHT,
+    'genres': GENRE_WEIGHT,
+    'keywords': KEYWORD_WEIGHT,
+}
+
+# Features whose labels are people rather than plain names
+PEOPLE_FEATURES = ('actors', 'directors')
+
+
+class SparseRecommender:
+    """
+    In-memory version of the Movie Recommendations query. Movie-actor,
+    movie-director, movie-genre and movie-keyword incidence are held as one
+    binary CSR matrix, and a transposed copy with each column scaled by its
+    feature weight. One sparse row-times-matrix product then gives the
+    weighted overlap of the source movie with every other movie, touching
+    only the movies that share something with it. Scores, fields and weights
+    match the Cypher query.
+    """
+
+    def __init__(self, movies: List[Dict], incidence: Dict[str, List[Tuple[int, object, object]]]):
+        """
+        `movies` are rows of MOVIES_QUERY; `incidence` maps each feature to
+        (movie tmdb_id, feature key, label) tuples
+        """
+        self.movies = movies
+        self.index = {movie['id']: i for i, movie in enumerate(movies)}
+        n = len(movies)
+
+        rating = np.array([movie['rating'] or 0.0 for movie in movies], dtype=np.float64)
+        votes = np.array([movie['vote_count'] or 0 for movie in movies], dtype=np.int64)
+        popularity = np.array([movie['popularity'] or 0.0 for movie in movies], dtype=np.float64)
+        # Same integer vote_count / 1000 as the Cypher normalized_rating
+        normalized_rating = np.where(votes > 1000, rating / 10, rating * np.sqrt(votes // 1000) / 10)
+        self.base_score = normalized_rating * RATING_WEIGHT + popularity / 1000 * POPULARITY_WEIGHT
+
+        self.matrices: Dict[str, sparse.csr_matrix] = {}
+        self.labels: Dict[str, List] = {}
+        for feature in FEATURE_WEIGHTS:
+            keys: Dict = {}
+            labels = []
+            rows = []
+            cols = []
+            for movie_id, key, label in incidence.get(feature, ()):
+                i = self.index.get(movie_id)
+                if i is None:
+                    continue
+                if key not in keys:
+                    keys[key] = len(labels)
+                    labels.append(label)
+                rows.append(i)
+                cols.append(keys[key])
+            matrix = sparse.csr_matrix(
+                (np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(n, len(labels)))
+            matrix.sum_duplicates()
+            matrix.data[:] = 1.0
+            self.matrices[feature] = matrix
+            self.labels[feature] = labels
+
+        self.features = sparse.hstack(list(self.matrices.values()), format='csr', dtype=np.float32)
+        weights = np.concatenate([
+            np.full(self.matrices[feature].shape[1], weight, dtype=np.float32)
+            for feature, weight in FEATURE_WEIGHTS.items()
+        ])
+        self.weighted_t = (self.features @ sparse.diags(weights)).T.tocsr()
+
+    @classmethod
+    def from_driver(cls, driver) -> 'SparseRecommender':
+        start = time.monotonic()
+        with driver.session() as session:
+            movies = [dict(record) for record in session.run(MOVIES_QUERY)]
+            incidence = {}
+            for feature, query in INCIDENCE_QUERIES.items():
+                if feature in PEOPLE_FEATURES:
+                    incidence[feature] = [
+                        (record['movie'], record['key'],
+                         {'name': record['name'], 'profile_path': record['profile_path'], 'id': record['key']})
+                        for record in session.run(query)
+                    ]
+                else:
+                    incidence[feature] = [
+                        (record['movie'], record['key'], record['name']) for record in session.run(query)
+                    ]
+        recommender = cls(movies, incidence)
+        logger.info(
+            f"Built sparse recommender for {len(movies)} movies and {recommender.features.nnz} "
+            f"links in {time.monotonic() - start:.1f}s"
+        )
+        return recommender
+
+    def _columns(self, feature: str, i: int) -> np.ndarray:
+        matrix = self.matrices[feature]
+        return matrix.indices[matrix.indptr[i]:matrix.indptr[i + 1]]
+
+    def recommend(self, tmdb_id: int, limit: int = 10) -> List[Dict]:
+        """
+        Top `limit` movies for the movie with `tmdb_id`, with the same fields
+        as the page's recommendation query
+        """
+        source = self.index.get(tmdb_id)
+        if source is None:
+            return []
+        overlap = self.features[source] @ self.weighted_t
+        candidates = overlap.indices
+        scores = overlap.data.astype(np.float64)
+        keep = (candidates != source) & (scores > 0)
+        candidates = candidates[keep]
+        scores = scores[keep] + self.base_score[candidates]
+        if len(candidates) > limit:
+            best = np.argpartition(-scores, limit - 1)[:limit]
+            candidates = candidates[best]
+            scores = scores[best]
+        order = np.argsort(-scores, kind='stable')
+
+        source_columns = {feature: self._columns(feature, source) for feature in FEATURE_WEIGHTS}
+        results = []
+        for j, score in zip(candidates[order], scores[order]):
+            movie = self.movies[j]
+            common = {
+                feature: [
+                    self.labels[feature][column]
+                    for column in np.intersect1d(source_columns[feature], self._columns(feature, j),
+                                                 assume_unique=True)
+                ]
+                for feature in FEATURE_WEIGHTS
+            }
+            results.append({
+                'title': movie['title'],
+                'rating': movie['rating'],
+                'vote_count': movie['vote_count'],
+                'overview': movie['overview'],
+                'poster': movie['poster'],
+                'release_date': movie['release_date'],
+                'recommendation_score': float(score),
+                'common_actors': common['actors'],
+                'common_directors': common['directors'],
+                'common_genres': common['genres'],
+                'common_keywords': common['keywords'],
+                'actor_count': len(common['actors']),
+                'director_count': len(common['directors']),
+                'genre_count': len(common['genres']),
+                'keyword_count': len(common['keywords']),
+            })
+        return results
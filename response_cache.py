@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+import logging
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.getenv('TMDB_CACHE_PATH', '.tmdb_cache.sqlite')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+# Seconds a response stays fresh, by path prefix. First match wins, a TTL of
+# 0 means the endpoint is never cached. The loader revalidates movie details
+# on every run regardless (see MovieDatabase.build_pipeline), so their TTL
+# only saves requests for other callers; unchanged details come back as 304s.
+# Listings must expire well within the nightly load interval.
+DEFAULT_TTLS: List[Tuple[str, int]] = [
+    ('/movie/changes', 0),
+    ('/person/changes', 0),
+    ('/movie/popular', 6 * 3600),
+    ('/genre/', 7 * 86400),
+    ('/search/', 86400),
+    ('/movie/', 7 * 86400),
+    ('/person/', 7 * 86400),
+]
+DEFAULT_TTL = 86400
+
+
+class ResponseCache:
+    """
+    SQLite-backed cache of TMDB JSON responses keyed by url and params.
+    Entries expire per endpoint, are evicted least-recently-used once the
+    cache grows past `max_bytes`, and keep their ETag/Last-Modified so stale
+    entries can be revalidated with a conditional request.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttls: Optional[List[Tuple[str, int]]] = None, default_ttl: int = DEFAULT_TTL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.default_ttl = default_ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self.conn.commit()
+        self.total_bytes = self.conn.execute("SELECT coalesce(sum(size), 0) FROM responses").fetchone()[0]
+        self.counters = {'hits': 0, 'misses': 0, 'revalidated': 0, 'stores': 0, 'evictions': 0}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def ttl_for(self, path: str) -> int:
+        for prefix, ttl in self.ttls:
+            if path.startswith(prefix):
+                return ttl
+        return self.default_ttl
+
+    @staticmethod
+    def make_key(url: str, params: Optional[Dict]) -> str:
+        raw = url + '?' + json.dumps(params or {}, sort_keys=True)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def lookup(self, key: str) -> Optional[Dict]:
+        """
+        Return the cached entry for `key` (fresh or stale) or None.
+        The entry dict has `data`, `fresh`, `etag` and `last_modified`.
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT body, etag, last_modified, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            self.conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+        body, etag, last_modified, expires_at = row
+        return {
+            'data': json.loads(zlib.decompress(body)),
+            'fresh': expires_at > now,
+            'etag': etag,
+            'last_modified': last_modified
+        }
+
+    def store(self, key: str, url: str, path: str, data: Dict,
+              etag: Optional[str] = None, last_modified: Optional[str] = None):
+        """
+        Store a response body, then evict least recently used entries if the
+        cache is over its size cap
+        """
+        ttl = self.ttl_for(path)
+        if ttl <= 0:
+            return
+        body = zlib.compress(json.dumps(data).encode('utf-8'))
+        now = time.time()
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if old:
+                self.total_bytes -= old[0]
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, url, body, etag, last_modified, now + ttl, now, len(body))
+            )
+            self.total_bytes += len(body)
+            self.counters['stores'] += 1
+            self._evict()
+            self.conn.commit()
+
+    def refresh(self, key: str, path: str):
+        """
+        Mark an entry fresh again after a 304 Not Modified
+        """
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "UPDATE responses SET expires_at = ?, last_access = ? WHERE key = ?",
+                (now + self.ttl_for(path), now, key)
+            )
+            self.conn.commit()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes:
+            rows = self.conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access LIMIT 100"
+            ).fetchall()
+            if not rows:
+                self.total_bytes = 0
+                return
+            for key, size in rows:
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.total_bytes -= size
+                self.counters['evictions'] += 1
+                if self.total_bytes <= self.max_bytes:
+                    break
+
+    def record(self, counter: str):
+        with self.lock:
+            self.counters[counter] += 1
+
+    def stats(self) -> Dict:
+        """
+        Hit/miss counters plus current size of the cache
+        """
+        with self.lock:
+            stats = dict(self.counters)
+            stats['bytes'] = self.total_bytes
+        lookups = stats['hits'] + stats['misses'] + stats['revalidated']
+        stats['hit_ratio'] = round((stats['hits'] + stats['revalidated']) / lookups, 3) if lookups else 0.0
+        return stats
@@ -0,0 +1,121 @@
+import logging
+from typing import Dict, List
+
+from analytics import rebuild_genre_stats
+
+logger = logging.getLogger(__name__)
+
+# Uniqueness constraints also give MERGE on tmdb_id an index to seek on
+CONSTRAINTS = {
+    'movie_tmdb_id': "CREATE CONSTRAINT movie_tmdb_id IF NOT EXISTS FOR (m:Movie) REQUIRE m.tmdb_id IS UNIQUE",
+    'person_tmdb_id': "CREATE CONSTRAINT person_tmdb_id IF NOT EXISTS FOR (p:Person) REQUIRE p.tmdb_id IS UNIQUE",
+    'genre_tmdb_id': "CREATE CONSTRAINT genre_tmdb_id IF NOT EXISTS FOR (g:Genre) REQUIRE g.tmdb_id IS UNIQUE",
+    'keyword_tmdb_id': "CREATE CONSTRAINT keyword_tmdb_id IF NOT EXISTS FOR (k:Keyword) REQUIRE k.tmdb_id IS UNIQUE",
+    # Work queue shards for sharded runs (see work_queue.py)
+    'ingest_shard_key': "CREATE CONSTRAINT ingest_shard_key IF NOT EXISTS FOR (s:IngestShard) "
+                        "REQUIRE (s.run, s.shard) IS UNIQUE",
+    # Analytics Dashboard leaderboards (see analytics.py)
+    'leaderboard_name': "CREATE CONSTRAINT leaderboard_name IF NOT EXISTS FOR (b:Leaderboard) REQUIRE b.name IS UNIQUE",
+}
+
+# Properties app.py looks movies up by, filters on or sorts by
+INDEXES = {
+    'movie_title': "CREATE INDEX movie_title IF NOT EXISTS FOR (m:Movie) ON (m.title)",
+    'movie_vote_average': "CREATE INDEX movie_vote_average IF NOT EXISTS FOR (m:Movie) ON (m.vote_average)",
+    'movie_popularity': "CREATE INDEX movie_popularity IF NOT EXISTS FOR (m:Movie) ON (m.popularity)",
+    'movie_release_date': "CREATE INDEX movie_release_date IF NOT EXISTS FOR (m:Movie) ON (m.release_date)",
+    'movie_release_year': "CREATE INDEX movie_release_year IF NOT EXISTS FOR (m:Movie) ON (m.release_year)",
+    # Ranks actors when the prolific_actors leaderboard is rebuilt
+    'person_movie_count': "CREATE INDEX person_movie_count IF NOT EXISTS FOR (p:Person) ON (p.movie_count)",
+    # Case-insensitive, prefix and fuzzy title search (see movie_search.py)
+    'movie_title_fulltext': "CREATE FULLTEXT INDEX movie_title_fulltext IF NOT EXISTS FOR (m:Movie) ON EACH [m.title]",
+}
+
+
+def create_schema(session):
+    """
+    Idempotently create every constraint and index the movie graph uses
+    """
+    for name, query in {**CONSTRAINTS, **INDEXES}.items():
+        try:
+            session.run(query).consume()
+            logger.info(f"Ensured schema item {name}")
+        except Exception as e:
+            # e.g. duplicate tmdb_ids left over from before the constraint existed
+            logger.error(f"Could not create {name}: {str(e)}")
+
+
+def missing_schema(session) -> Dict[str, List[str]]:
+    """
+    Report expected indexes that don't exist yet and those that exist but
+    are not ONLINE (still populating, or FAILED)
+    """
+    states = {
+        record['name']: record['state']
+        for record in session.run("SHOW INDEXES YIELD name, state")
+    }
+    expected = list(CONSTRAINTS) + list(INDEXES)
+    return {
+        'missing': [name for name in expected if name not in states],
+        'not_online': [name for name in expected if name in states and states[name] != 'ONLINE'],
+    }
+
+
+def migrate_release_dates(session):
+    """
+    Convert release_date strings left by older loaders to native dates and
+    fill in release_year. Empty dates become null. Movies already converted
+    have a release_year (or no release_date) and are skipped.
+    """
+    summary = session.run("""
+    MATCH (m:Movie)
+    WHERE m.release_year IS NULL AND m.release_date IS NOT NULL
+    CALL {
+        WITH m
+        SET m.release_date = CASE WHEN m.release_date = '' THEN null ELSE date(m.release_date) END
+        SET m.release_year = m.release_date.year
+    } IN TRANSACTIONS OF 10000 ROWS
+    """).consume()
+    if summary.counters.properties_set:
+        logger.info(f"Migrated release dates ({summary.counters.properties_set} properties set)")
+
+
+# Data migrations in the order they were introduced. SyncState.schema_version
+# records how many have been applied, so each runs once per database.
+MIGRATIONS = [
+    migrate_release_dates,
+    # Genre stats moved from recomputed averages to running sums
+    rebuild_genre_stats,
+]
+
+
+def run_migrations(session):
+    """
+    Apply the migrations this database hasn't had yet. Clearing the
+    database removes the record, so they run again (on an empty graph).
+    """
+    record = session.run("MATCH (s:SyncState {name: 'tmdb'}) RETURN s.schema_version AS version").single()
+    version = record['version'] if record and record['version'] else 0
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        migration(session)
+        session.run("MERGE (s:SyncState {name: 'tmdb'}) SET s.schema_version = $version", version=number)
+        logger.info(f"Applied migration {number} ({migration.__name__})")
+
+
+def ensure_schema(session, timeout: int = 300) -> bool:
+    """
+    Create the schema, wait up to `timeout` seconds for every index to come
+    online and log anything still missing. Returns True when all are online.
+    """
+    create_schema(session)
+    try:
+        session.run(f"CALL db.awaitIndexes({int(timeout)})").consume()
+    except Exception as e:
+        logger.warning(f"Timed out waiting for indexes: {str(e)}")
+
+    report = missing_schema(session)
+    if report['missing'] or report['not_online']:
+        logger.error(f"Schema incomplete, missing: {report['missing']}, not online: {report['not_online']}")
+        return False
+    logger.info("All constraints and indexes are online")
+    return True
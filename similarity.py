@@ -0,0 +1,162 @@
+import logging
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+# Recommendation score weights, as used by the Movie Recommendations page
+ACTOR_WEIGHT = 3
+DIRECTOR_WEIGHT = 5
+GENRE_WEIGHT = 2
+KEYWORD_WEIGHT = 1
+RATING_WEIGHT = 4
+POPULARITY_WEIGHT = 2
+
+# SIMILAR_TO relationships kept per movie
+DEFAULT_TOP_K = 10
+
+# Rating damped for movies with few votes. Format with the variable holding
+# vote_average and vote_count, e.g. NORMALIZED_RATING.format('m').
+# vote_count / 1000 is integer division, exactly as the page always computed it.
+NORMALIZED_RATING = (
+    "CASE WHEN {0}.vote_count > 1000 THEN {0}.vote_average / 10 "
+    "ELSE ({0}.vote_average * sqrt({0}.vote_count / 1000)) / 10 END"
+)
+
+# Keywords shared by more movies than this don't make movies candidates on
+# their own (like genres, they would match a large share of the catalog), but
+# still count towards the score of candidates found through something else
+MAX_KEYWORD_FANOUT = 500
+
+# Movies sharing at least one actor, director or not-too-common keyword with
+# `source`, with the number of actors, directors, genres and keywords they
+# share. Genres never generate candidates: with only ~19 of them, expanding
+# through them would touch most of the catalog for every movie. Shared genres
+# and keywords are counted per candidate from `source`'s few of each instead.
+_OVERLAPS = """
+CALL {
+    WITH source
+    MATCH (source)<-[:ACTED_IN]-(p:Person)-[:ACTED_IN]->(m:Movie)
+    WHERE m <> source
+    RETURN m, count(DISTINCT p) AS actors, 0 AS directors
+    UNION ALL
+    WITH source
+    MATCH (source)<-[:DIRECTED]-(p:Person)-[:DIRECTED]->(m:Movie)
+    WHERE m <> source
+    RETURN m, 0 AS actors, count(DISTINCT p) AS directors
+    UNION ALL
+    WITH source
+    MATCH (source)-[:HAS_KEYWORD]->(k:Keyword)
+    WHERE COUNT { (k)<-[:HAS_KEYWORD]-() } <= $max_keyword_fanout
+    MATCH (k)<-[:HAS_KEYWORD]-(m:Movie)
+    WHERE m <> source
+    RETURN DISTINCT m, 0 AS actors, 0 AS directors
+}
+WITH source, m, sum(actors) AS actors, sum(directors) AS directors
+CALL {
+    WITH source, m
+    OPTIONAL MATCH (source)-[:IN_GENRE]->(g:Genre)<-[:IN_GENRE]-(m)
+    WITH source, m, count(DISTINCT g) AS genres
+    OPTIONAL MATCH (source)-[:HAS_KEYWORD]->(k:Keyword)<-[:HAS_KEYWORD]-(m)
+    RETURN genres, count(DISTINCT k) AS keywords
+}
+WITH source, m, actors, directors, genres, keywords,
+     actors * $actor_weight + directors * $director_weight +
+     genres * $genre_weight + keywords * $keyword_weight AS overlap
+"""
+
+# Replace each source movie's outgoing SIMILAR_TO with its top K. The score
+# includes the recommended movie's rating and popularity, as on the page.
+_REFRESH_OUTGOING = """
+UNWIND $ids AS id
+MATCH (source:Movie {tmdb_id: id})
+OPTIONAL MATCH (source)-[old:SIMILAR_TO]->()
+DELETE old
+WITH DISTINCT source
+""" + _OVERLAPS + """
+WITH source, m, actors, directors, genres, keywords,
+     overlap + coalesce(m.normalized_rating, 0) * $rating_weight +
+     coalesce(m.popularity, 0) / 1000 * $popularity_weight AS score
+ORDER BY score DESC
+WITH source, collect({
+    m: m, score: score, actors: actors, directors: directors, genres: genres, keywords: keywords
+})[..$top_k] AS top
+UNWIND top AS row
+WITH source, row, row.m AS m
+CREATE (source)-[:SIMILAR_TO {
+    score: row.score, actors: row.actors, directors: row.directors,
+    genres: row.genres, keywords: row.keywords
+}]->(m)
+"""
+
+# Re-rank `source` in the lists of every movie it overlaps with: it goes in
+# where it beats that movie's weakest kept neighbour, which is then dropped
+_REFRESH_INCOMING = """
+MATCH (source:Movie {tmdb_id: $id})
+OPTIONAL MATCH (source)<-[old:SIMILAR_TO]-()
+DELETE old
+WITH DISTINCT source
+""" + _OVERLAPS + """
+WITH source, m, actors, directors, genres, keywords,
+     overlap + coalesce(source.normalized_rating, 0) * $rating_weight +
+     coalesce(source.popularity, 0) / 1000 * $popularity_weight AS score
+OPTIONAL MATCH (m)-[kept:SIMILAR_TO]->()
+WITH source, m, actors, directors, genres, keywords, score,
+     count(kept) AS kept_count, min(kept.score) AS weakest
+WHERE kept_count < $top_k OR score > weakest
+CREATE (m)-[:SIMILAR_TO {
+    score: score, actors: actors, directors: directors, genres: genres, keywords: keywords
+}]->(source)
+WITH m, kept_count
+WHERE kept_count >= $top_k
+MATCH (m)-[r:SIMILAR_TO]->()
+WITH m, r ORDER BY r.score ASC
+WITH m, collect(r) AS rels
+FOREACH (r IN rels[..size(rels) - $top_k] | DELETE r)
+"""
+
+
+def _weights(top_k: int) -> dict:
+    return {
+        'actor_weight': ACTOR_WEIGHT,
+        'director_weight': DIRECTOR_WEIGHT,
+        'genre_weight': GENRE_WEIGHT,
+        'keyword_weight': KEYWORD_WEIGHT,
+        'rating_weight': RATING_WEIGHT,
+        'popularity_weight': POPULARITY_WEIGHT,
+        'top_k': top_k,
+        'max_keyword_fanout': MAX_KEYWORD_FANOUT,
+    }
+
+
+def update_similarities(tx, movie_ids: List[int], top_k: int = DEFAULT_TOP_K, incoming: bool = True):
+    """
+    Recompute the SIMILAR_TO neighbourhood of `movie_ids` after they were
+    added or changed: their own top-K lists and, with `incoming`, their place
+    in the lists of the movies they overlap with. Nothing else is touched.
+    """
+    if not movie_ids:
+        return
+    tx.run(_REFRESH_OUTGOING, ids=movie_ids, **_weights(top_k)).consume()
+    if incoming:
+        for movie_id in movie_ids:
+            tx.run(_REFRESH_INCOMING, id=movie_id, **_weights(top_k)).consume()
+
+
+def rebuild_similarities(driver, batch_size: int = 100, top_k: int = DEFAULT_TOP_K):
+    """
+    Recompute normalized_rating and every movie's SIMILAR_TO list from
+    scratch, e.g. for a graph loaded before they were maintained at ingest
+    """
+    with driver.session() as session:
+        session.run(f"""
+        MATCH (m:Movie)
+        CALL {{
+            WITH m
+            SET m.normalized_rating = {NORMALIZED_RATING.format('m')}
+        }} IN TRANSACTIONS OF 10000 ROWS
+        """).consume()
+        movie_ids = [record['id'] for record in session.run("MATCH (m:Movie) RETURN m.tmdb_id AS id")]
+        for i in range(0, len(movie_ids), batch_size):
+            # Every list is rebuilt in full, so incoming updates would only redo work
+            session.execute_write(update_similarities, movie_ids[i:i + batch_size], top_k, False)
+            logger.info(f"Rebuilt similarities for {min(i + batch_size, len(movie_ids))}/{len(movie_ids)} movies")
@@ -0,0 +1,89 @@
+import gzip
+import json
+import os
+import threading
+import time
+import logging
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Compressed data is flushed to disk at least this often, so a crash loses
+# at most a few seconds of payloads rather than the whole gzip buffer
+FLUSH_SECONDS = 5.0
+FLUSH_RECORDS = 1000
+
+
+def snapshot_parts(path: str) -> List[str]:
+    """
+    Files making up the snapshot at `path`, in the order they were written:
+    `path` itself, then `path.1`, `path.2`, ... one per later run
+    """
+    parts = []
+    while True:
+        part = path if not parts else f'{path}.{len(parts)}'
+        if not os.path.exists(part):
+            return parts
+        parts.append(part)
+
+
+class SnapshotWriter:
+    """
+    Append-only, gzip-compressed JSON-lines archive of raw TMDB payloads.
+    Each line holds the request path, params, fetch time and response body.
+    Every run writes its own file next to the earlier ones (see
+    snapshot_parts), so a run that crashed and left a truncated file never
+    makes later runs' payloads unreadable.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.part = f'{path}.{len(snapshot_parts(path))}' if os.path.exists(path) else path
+        self.file = gzip.open(self.part, 'wt', encoding='utf-8')
+        self.count = 0
+        self.unflushed = 0
+        self.flushed_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def write(self, path: str, params: Optional[Dict], data: Dict):
+        line = json.dumps({
+            'path': path,
+            'params': params or {},
+            'fetched_at': datetime.now().isoformat(),
+            'data': data
+        })
+        with self.lock:
+            self.file.write(line + '\n')
+            self.count += 1
+            self.unflushed += 1
+            if self.unflushed >= FLUSH_RECORDS or time.monotonic() - self.flushed_at >= FLUSH_SECONDS:
+                self._flush()
+
+    def _flush(self):
+        # A sync flush makes everything written so far decodable, even
+        # if the gzip trailer is never written
+        self.file.flush()
+        self.unflushed = 0
+        self.flushed_at = time.monotonic()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+        logger.info(f"Wrote {self.count} payloads to snapshot {self.part}")
+
+
+def read_snapshot(path: str) -> Iterator[Dict]:
+    """
+    Yield the records of a snapshot, across all its files, in the order they
+    were written. A truncated tail, e.g. from a crashed run, ends that
+    run's file with a warning and reading goes on with the next one.
+    """
+    for part in snapshot_parts(path):
+        with gzip.open(part, 'rt', encoding='utf-8') as f:
+            try:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+            except (EOFError, json.JSONDecodeError) as e:
+                logger.warning(f"Snapshot {part} ends with a truncated record: {str(e)}")
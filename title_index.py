@@ -0,0 +1,83 @@
+import re
+import time
+import heapq
+import logging
+from bisect import bisect_left
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+TITLES_QUERY = """
+MATCH (m:Movie)
+WHERE m.title IS NOT NULL
+RETURN m.tmdb_id AS tmdb_id, m.title AS title, m.release_year AS year, m.popularity AS popularity
+"""
+
+# Matches offered by the picker
+DEFAULT_LIMIT = 20
+
+
+def normalize(text: str) -> str:
+    return ' '.join(re.findall(r'\w+', text.casefold()))
+
+
+class TitleIndex:
+    """
+    In-process prefix index over movie titles for the type-ahead picker.
+    Every title is stored once per word it contains, as the normalized text
+    from that word on, in one sorted list. A prefix lookup is then a binary
+    search to the first key starting with the prefix and a scan of the keys
+    that follow, so "matr" finds "The Matrix" as well as "Matrix Reloaded".
+    """
+
+    def __init__(self, movies: List[Dict]):
+        """
+        `movies` are rows of TITLES_QUERY
+        """
+        self.movies = movies
+        entries = []
+        for i, movie in enumerate(movies):
+            words = normalize(movie['title']).split(' ')
+            for start in range(len(words)):
+                if words[start]:
+                    entries.append((' '.join(words[start:]), start == 0, i))
+        entries.sort()
+        self.keys = [key for key, _, _ in entries]
+        self.entries = [(from_start, i) for _, from_start, i in entries]
+
+    @classmethod
+    def from_driver(cls, driver) -> 'TitleIndex':
+        start = time.monotonic()
+        with driver.session() as session:
+            movies = [dict(record) for record in session.run(TITLES_QUERY)]
+        index = cls(movies)
+        logger.info(f"Built title index for {len(movies)} movies in {time.monotonic() - start:.1f}s")
+        return index
+
+    @staticmethod
+    def label(movie: Dict) -> str:
+        """
+        Title with its release year, to tell remakes and namesakes apart
+        """
+        return f"{movie['title']} ({movie['year']})" if movie['year'] else movie['title']
+
+    def search(self, prefix: str, limit: int = DEFAULT_LIMIT) -> List[Dict]:
+        """
+        Up to `limit` movies with a word of their title starting with
+        `prefix` (all words of it, in order, ignoring case and punctuation).
+        Titles that start with it come first, then the most popular.
+        """
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        best: Dict[int, bool] = {}
+        for position in range(bisect_left(self.keys, prefix), len(self.keys)):
+            if not self.keys[position].startswith(prefix):
+                break
+            from_start, i = self.entries[position]
+            best[i] = best.get(i, False) or from_start
+        top = heapq.nlargest(
+            limit, best.items(),
+            key=lambda item: (item[1], self.movies[item[0]]['popularity'] or 0.0)
+        )
+        return [self.movies[i] for i, _ in top]
@@ -0,0 +1,198 @@
+import requests
+import threading
+import time
+import re
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, Optional
+from response_cache import ResponseCache
+from snapshot import SnapshotWriter
+from ingest_metrics import IngestMetrics
+
+logger = logging.getLogger(__name__)
+
+# TMDB allows roughly 50 requests per second per IP. Stay a little under it.
+DEFAULT_RATE = 40.0
+DEFAULT_BURST = 40
+DEFAULT_CONCURRENCY = 8
+DEFAULT_MAX_RETRIES = 5
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+def endpoint_label(path: str) -> str:
+    '''
+    Collapse ids so metrics group by endpoint, e.g. /movie/123 -> /movie/{id}
+    '''
+    return re.sub(r'/\d+', '/{id}', path)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket shared by every request made through a client.
+    `rate` tokens are added per second, up to `capacity`.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, capacity: int = DEFAULT_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Block until a token is available, then take it
+        """
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    wait = self.paused_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """
+        Stop handing out tokens for `seconds`, e.g. after a 429 with Retry-After.
+        The bucket is emptied so callers don't burst as soon as the pause ends.
+        """
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+            self.updated = self.paused_until
+
+
+class TMDBClient:
+    """
+    Minimal TMDB API client with a shared rate limiter, retries on 429/5xx,
+    an optional on-disk response cache, an optional snapshot archive of every
+    payload returned, optional metrics and a thread pool for concurrent fetching
+    """
+
+    def __init__(self, access_token: str, base_url: str = 'https://api.themoviedb.org/3',
+                 concurrency: int = DEFAULT_CONCURRENCY, rate: float = DEFAULT_RATE,
+                 burst: int = DEFAULT_BURST, max_retries: int = DEFAULT_MAX_RETRIES,
+                 cache: Optional[ResponseCache] = None, snapshot: Optional[SnapshotWriter] = None,
+                 metrics: Optional[IngestMetrics] = None):
+        self.base_url = base_url
+        self.headers = {
+            'Authorization': f'Bearer {access_token}',
+            'accept': 'application/json'
+        }
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+        self.limiter = TokenBucket(rate, burst)
+        self.cache = cache
+        self.snapshot = snapshot
+        self.metrics = metrics
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        # requests.Session is not guaranteed thread-safe, so keep one per thread
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.headers)
+            self._local.session = session
+        return session
+
+    def get(self, path: str, params: Optional[Dict] = None, refresh: bool = False) -> Dict:
+        """
+        GET `path` relative to the API base url and return the decoded JSON.
+        Fresh cached responses are returned without a request unless `refresh`
+        is set; stale ones are revalidated with ETag/Last-Modified.
+        Raises requests.HTTPError once retries are exhausted.
+        """
+        url = f'{self.base_url}{path}'
+        endpoint = endpoint_label(path)
+        key = None
+        cached = None
+        headers = {}
+        if self.cache is not None:
+            key = self.cache.make_key(url, params)
+            cached = self.cache.lookup(key)
+            if cached and cached['fresh'] and not refresh:
+                self.cache.record('hits')
+                self._count('tmdb_cache_hits_total', endpoint=endpoint)
+                return self._archive(path, params, cached['data'])
+            if cached and cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached and cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        for attempt in range(self.max_retries + 1):
+            waited = time.monotonic()
+            self.limiter.acquire()
+            requested = time.monotonic()
+            response = self._session().get(url, params=params, headers=headers, timeout=30)
+            if self.metrics is not None:
+                self.metrics.observe('tmdb_rate_limiter_wait_seconds', requested - waited)
+                self.metrics.observe('tmdb_request_seconds', time.monotonic() - requested, endpoint=endpoint)
+                self.metrics.inc('tmdb_requests_total', endpoint=endpoint, status=response.status_code)
+            if response.status_code == 304 and cached:
+                self.cache.record('revalidated')
+                self.cache.refresh(key, path)
+                return self._archive(path, params, cached['data'])
+            if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                response.raise_for_status()
+                data = response.json()
+                if self.cache is not None:
+                    self.cache.record('misses')
+                    self.cache.store(key, url, path, data,
+                                     response.headers.get('ETag'), response.headers.get('Last-Modified'))
+                return self._archive(path, params, data)
+
+            delay = self._retry_delay(response, attempt)
+            logger.warning(f'{response.status_code} from {path}, retrying in {delay:.1f}s')
+            self._count('tmdb_retries_total', endpoint=endpoint, status=response.status_code)
+            if response.status_code == 429:
+                # Everyone sharing the limiter backs off, not just this thread
+                self.limiter.pause(delay)
+            else:
+                time.sleep(delay)
+
+    def _count(self, name: str, **labels):
+        if self.metrics is not None:
+            self.metrics.inc(name, **labels)
+
+    def _archive(self, path: str, params: Optional[Dict], data: Dict) -> Dict:
+        if self.snapshot is not None:
+            self.snapshot.write(path, params, data)
+        return data
+
+    def _retry_delay(self, response: requests.Response, attempt: int) -> float:
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                return max(0.0, float(retry_after))
+            except ValueError:
+                pass
+        return min(30.0, 0.5 * 2 ** attempt)
+
+    def map(self, func: Callable, items: Iterable) -> Iterator:
+        """
+        Apply `func` to every item using up to `concurrency` threads.
+        Results are yielded in input order and only a small window of items
+        is in flight at once, so `items` can be a long generator.
+        """
+        if self.concurrency == 1:
+            for item in items:
+                yield func(item)
+            return
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            pending = deque()
+            for item in items:
+                pending.append(executor.submit(func, item))
+                if len(pending) >= self.concurrency * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
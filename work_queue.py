@@ -0,0 +1,227 @@
+import threading
+import logging
+from contextlib import contextmanager
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Shard sizes: listing pages hold 20 movies each
+DEFAULT_PAGES_PER_SHARD = 5
+DEFAULT_IDS_PER_SHARD = 200
+
+# Shards created per transaction when enqueueing
+ENQUEUE_BATCH_SIZE = 100
+
+# Claims tried per claim() call, each skipping the shards other workers
+# just took, before reporting that there is no work
+CLAIM_ATTEMPTS = 5
+
+
+def chunked(items: Iterable[int], size: int) -> Iterator[List[int]]:
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class WorkQueue:
+    """
+    Lease-based queue of ingestion shards, stored as (:IngestShard) nodes in
+    Neo4j so workers on any host can share it. A worker claims a shard for
+    `lease_seconds` and keeps renewing the lease while it works; a shard
+    whose lease runs out (e.g. because its worker crashed) can be claimed
+    again, up to `max_attempts` times. Lease times use the database clock,
+    so workers' clocks don't need to agree.
+    """
+
+    def __init__(self, driver, run: str, lease_seconds: int = DEFAULT_LEASE_SECONDS,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.driver = driver
+        self.run = run
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+    def enqueue(self, kind: str, shards: Iterable[List[int]]) -> int:
+        """
+        Add shards of `kind` ('pages' or 'ids'), numbered in order.
+        Idempotent: shards that already exist for this run are left alone,
+        so every worker of a run can enqueue the same work.
+        """
+        count = 0
+        with self.driver.session() as session:
+            batch = []
+            for number, items in enumerate(shards):
+                batch.append({'shard': number, 'items': items})
+                if len(batch) == ENQUEUE_BATCH_SIZE:
+                    session.execute_write(self._create_shards, kind, batch)
+                    batch = []
+                count += 1
+            if batch:
+                session.execute_write(self._create_shards, kind, batch)
+        logger.info(f"Run {self.run} has {count} {kind} shards")
+        return count
+
+    def _create_shards(self, tx, kind: str, shards: List[Dict]):
+        tx.run("""
+        UNWIND $shards AS row
+        MERGE (s:IngestShard {run: $run, shard: row.shard})
+        ON CREATE SET s.kind = $kind, s.items = row.items, s.status = 'pending',
+                      s.attempts = 0, s.created = toString(date())
+        """, shards=shards, run=self.run, kind=kind).consume()
+
+    def claim(self, worker: str) -> Optional[Dict]:
+        """
+        Lease the first claimable shard to `worker` and return it, or None if
+        no shard is pending and no lease has expired
+        """
+        with self.driver.session() as session:
+            session.execute_write(self._give_up_expired)
+            contested = []
+            for _ in range(CLAIM_ATTEMPTS):
+                record = session.execute_write(self._claim, worker, contested)
+                if record is None:
+                    return None
+                if record['claimed']:
+                    return {key: record[key] for key in ('shard', 'kind', 'items', 'attempts')}
+                # Another worker took it first; try the next claimable shard
+                contested.append(record['shard'])
+        return None
+
+    def _give_up_expired(self, tx):
+        # Shards whose last allowed lease expired are not retried again
+        tx.run("""
+        MATCH (s:IngestShard {run: $run, status: 'leased'})
+        WHERE s.lease_expires < timestamp() AND s.attempts >= $max_attempts
+        SET s.status = 'failed', s.owner = null
+        """, run=self.run, max_attempts=self.max_attempts).consume()
+
+    def _claim(self, tx, worker: str, skip: List[int]) -> Optional[Dict]:
+        # Setting _lock takes the node's write lock, held until commit, so the
+        # status is checked again after any concurrent claim of the same shard
+        # has committed. The property itself is removed straight away.
+        record = tx.run("""
+        MATCH (s:IngestShard {run: $run})
+        WHERE NOT s.shard IN $skip
+          AND (s.status = 'pending'
+               OR (s.status = 'leased' AND s.lease_expires < timestamp() AND s.attempts < $max_attempts))
+        WITH s ORDER BY s.shard LIMIT 1
+        SET s._lock = true
+        REMOVE s._lock
+        WITH s, (s.status = 'pending'
+                 OR (s.status = 'leased' AND s.lease_expires < timestamp() AND s.attempts < $max_attempts))
+                AS claimed
+        FOREACH (_ IN CASE WHEN claimed THEN [1] ELSE [] END |
+            SET s.status = 'leased', s.owner = $worker, s.attempts = s.attempts + 1,
+                s.lease_expires = timestamp() + $lease_ms
+        )
+        RETURN s.shard AS shard, s.kind AS kind, s.items AS items, s.attempts AS attempts, claimed
+        """, run=self.run, worker=worker, skip=skip, max_attempts=self.max_attempts,
+            lease_ms=self.lease_seconds * 1000).single()
+        return dict(record) if record else None
+
+    def renew(self, shard: int, worker: str) -> bool:
+        """
+        Extend `worker`'s lease on `shard`. Returns False if the lease was lost.
+        """
+        with self.driver.session() as session:
+            record = session.run("""
+            MATCH (s:IngestShard {run: $run, shard: $shard, status: 'leased', owner: $worker})
+            SET s.lease_expires = timestamp() + $lease_ms
+            RETURN count(s) AS renewed
+            """, run=self.run, shard=shard, worker=worker, lease_ms=self.lease_seconds * 1000).single()
+        return bool(record and record['renewed'])
+
+    def complete(self, shard: int, worker: str) -> bool:
+        """
+        Mark `shard` done, if `worker` still holds its lease
+        """
+        with self.driver.session() as session:
+            record = session.run("""
+            MATCH (s:IngestShard {run: $run, shard: $shard, status: 'leased', owner: $worker})
+            SET s.status = 'done', s.failed = []
+            RETURN count(s) AS completed
+            """, run=self.run, shard=shard, worker=worker).single()
+        return bool(record and record['completed'])
+
+    def fail(self, shard: int, worker: str, failed: List[int]) -> bool:
+        """
+        Give `shard` back to the queue for another attempt, or mark it failed
+        once it has used all its attempts. `failed` records the movie IDs that
+        didn't make it.
+        """
+        with self.driver.session() as session:
+            record = session.run("""
+            MATCH (s:IngestShard {run: $run, shard: $shard, status: 'leased', owner: $worker})
+            SET s.status = CASE WHEN s.attempts >= $max_attempts THEN 'failed' ELSE 'pending' END,
+                s.owner = null, s.failed = $failed
+            RETURN s.status AS status
+            """, run=self.run, shard=shard, worker=worker, failed=failed,
+                max_attempts=self.max_attempts).single()
+        return bool(record)
+
+    def remaining(self) -> int:
+        """
+        Number of shards not yet done or given up on
+        """
+        with self.driver.session() as session:
+            record = session.run("""
+            MATCH (s:IngestShard {run: $run})
+            WHERE s.status = 'pending'
+               OR (s.status = 'leased' AND (s.lease_expires >= timestamp() OR s.attempts < $max_attempts))
+            RETURN count(s) AS remaining
+            """, run=self.run, max_attempts=self.max_attempts).single()
+        return record['remaining'] if record else 0
+
+    def summary(self) -> Dict:
+        """
+        Shard counts by status, the run's creation date (ISO string) and
+        which shards failed
+        """
+        with self.driver.session() as session:
+            records = list(session.run("""
+            MATCH (s:IngestShard {run: $run})
+            RETURN s.status AS status, count(s) AS shards, min(s.created) AS created,
+                   collect(CASE WHEN s.status = 'failed' THEN s.shard END) AS failed_shards
+            """, run=self.run))
+        summary = {'shards': {}, 'failed_shards': [], 'created': None}
+        for record in records:
+            summary['shards'][record['status']] = record['shards']
+            summary['failed_shards'].extend(record['failed_shards'])
+            created = record['created']
+            if created is not None and (summary['created'] is None or created < summary['created']):
+                summary['created'] = created
+        return summary
+
+    @contextmanager
+    def lease(self, shard: int, worker: str):
+        """
+        Renew `worker`'s lease on `shard` in the background while the block
+        runs. Yields an Event that is set if the lease is lost, in which case
+        another worker may already be redoing the shard.
+        """
+        stop = threading.Event()
+        lost = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(self.lease_seconds / 3):
+                try:
+                    if not self.renew(shard, worker):
+                        logger.warning(f"Lost the lease on shard {shard} of run {self.run}")
+                        lost.set()
+                        return
+                except Exception as e:
+                    logger.error(f"Error renewing lease on shard {shard}: {str(e)}")
+
+        thread = threading.Thread(target=heartbeat, name=f'lease-{shard}', daemon=True)
+        thread.start()
+        try:
+            yield lost
+        finally:
+            stop.set()
+            thread.join()